@@ -0,0 +1,94 @@
+"""
+Benchmark of the vectorized crown area allometry against the original
+per-cohort loop. Run from the repository root:
+
+	python benchmarks/bench_allometry.py [restart_folder] [param_path] [repeat]
+"""
+import os
+import sys
+import time
+import numpy as np
+import netCDF4 as nc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fates_visualization.allometry import allom_params, crown_area, carea_stack
+from fates_visualization.files import Files
+
+
+def carea_loop(rest_fin, paramfin):
+	"""the per-cohort loop carea_allom used before allometry.py"""
+	ncohorts_max = len(rest_fin.variables['fates_CohortsPerPatch'][:])
+	pft = rest_fin.variables['fates_pft'][:]
+	dbh = rest_fin.variables['fates_dbh'][:]
+	carea = np.ma.masked_all(ncohorts_max)
+	carea_exp = paramfin.variables['fates_allom_d2bl2'][:]
+	d2ca_max = paramfin.variables['fates_allom_d2ca_coefficient_max'][:]
+	d2ca_min = paramfin.variables['fates_allom_d2ca_coefficient_min'][:]
+	expnt_diff = paramfin.variables['fates_allom_blca_expnt_diff'][:]
+	fates_spread = rest_fin.variables['fates_spread'][:]
+	fates_nplant = rest_fin.variables['fates_nplant'][:]
+	dbh_maxheight = paramfin.variables['fates_allom_dbh_maxheight'][:]
+	d2ca_coeff = d2ca_max * fates_spread + d2ca_min * (1. - fates_spread)
+	for i in range(ncohorts_max):
+		if pft[i] > 0:
+			eff_dbh = np.min([dbh[i], dbh_maxheight[pft[i] - 1]])
+			carea[i] = d2ca_coeff[pft[i] - 1] * (
+				eff_dbh ** (carea_exp[pft[i] - 1] + expnt_diff[pft[i] - 1])) * fates_nplant[i]
+	return carea
+
+
+def best_of(func, repeat):
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		result = func()
+		times.append(time.perf_counter() - start)
+	return min(times), result
+
+
+def main(rest_folder="sample_data/restart", param_path="sample_data/sample_param.nc", repeat=3):
+	paths = sorted(os.path.join(rest_folder, name) for name in os.listdir(rest_folder)
+		if name.endswith(".nc"))
+	rest_fins = [nc.Dataset(path) for path in paths]
+	paramfin = nc.Dataset(param_path)
+	params = allom_params(paramfin)
+
+	def loop():
+		return [carea_loop(rest_fin, paramfin) for rest_fin in rest_fins]
+
+	def vectorized():
+		return [crown_area(rest_fin.variables['fates_pft'][:], rest_fin.variables['fates_dbh'][:],
+			rest_fin.variables['fates_nplant'][:], rest_fin.variables['fates_spread'][:], params)
+			for rest_fin in rest_fins]
+
+	def stacked():
+		return carea_stack(rest_fins, paramfin)
+
+	t_loop, expected = best_of(loop, repeat)
+	t_vec, result = best_of(vectorized, repeat)
+	t_stack, stack = best_of(stacked, repeat)
+	for year, (old, new) in enumerate(zip(expected, result)):
+		assert np.array_equal(np.ma.getmaskarray(old), np.ma.getmaskarray(new))
+		assert np.ma.allclose(old, new) and np.ma.allclose(old, stack[year])
+
+	# a pool smaller than the run closes files while they are still held,
+	# every year must read its own file all the same
+	files = Files(os.path.abspath(rest_folder), param_path, address="absolute", max_open=2)
+	held = [rest_fin for _, rest_fin in files.restart.items()]
+	assert np.ma.allclose(carea_stack(held, files.param), stack)
+	for rest_fin, own in zip(held, rest_fins):
+		assert np.ma.allclose(rest_fin.variables['fates_dbh'][:], own.variables['fates_dbh'][:])
+	files.close()
+
+	ncohorts = sum(len(c) for c in expected)
+	print(f"{len(rest_fins)} restart files, {ncohorts} cohort slots")
+	print(f"loop:       {t_loop * 1000:10.2f} ms")
+	print(f"vectorized: {t_vec * 1000:10.2f} ms  ({t_loop / t_vec:.1f}x)")
+	print(f"stacked:    {t_stack * 1000:10.2f} ms  ({t_loop / t_stack:.1f}x)")
+
+
+if __name__ == "__main__":
+	args = sys.argv[1:]
+	if len(args) > 2:
+		args[2] = int(args[2])
+	main(*args)
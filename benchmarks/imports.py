@@ -0,0 +1,87 @@
+"""
+Import-time benchmark. Runs every import in a fresh interpreter, as a
+worker process would, and reports the best wall time of REPEAT runs and
+the heavy dependencies the import loaded. Run from the repository root:
+
+	python benchmarks/imports.py
+	python benchmarks/imports.py --repeat 10 --output imports.json
+	python benchmarks/imports.py --detail treemap   # slowest modules of one import
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+	"package": "import fates_visualization",
+	"files": "from fates_visualization import Files",
+	"pre_process": "from fates_visualization import pre_process",
+	"store": "from fates_visualization import CohortStore",
+	"export": "from fates_visualization import ExportService",
+	"treemap": "from fates_visualization.treemap import treemap",
+	"sunburst_matrix": "from fates_visualization.sunburst_matrix import sunburst_matrix",
+	"colored_map": "from fates_visualization.colored_map import colored_map",
+}
+HEAVY = ["numpy", "netCDF4", "pandas", "matplotlib", "plotly", "imageio", "kaleido"]
+
+TIMER = """
+import sys, time, json
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {heavy} if m in sys.modules]}}))
+"""
+
+
+def time_import(statement, repeat=5):
+	"""best seconds of REPEAT fresh imports, and the heavy modules loaded"""
+	runs = []
+	for _ in range(repeat):
+		out = subprocess.check_output([sys.executable, "-c",
+			TIMER.format(statement=statement, heavy=HEAVY)], cwd=ROOT)
+		runs.append(json.loads(out))
+	best = min(runs, key=lambda run: run["seconds"])
+	return {"statement": statement, "seconds": best["seconds"], "loaded": best["loaded"]}
+
+
+def detail(statement, top=15):
+	"""the TOP packages by the time spent importing their modules, from -X importtime"""
+	result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT,
+		capture_output=True, text=True, check=True)
+	packages = {}
+	for line in result.stderr.splitlines():
+		parts = line.split("|")
+		if len(parts) != 3 or not parts[0].split(":")[-1].strip().isdigit():
+			continue
+		package = parts[2].strip().split(".")[0]
+		packages[package] = packages.get(package, 0) + int(parts[0].split(":")[-1]) / 1e6
+	return sorted(((seconds, name) for name, seconds in packages.items()), reverse=True)[:top]
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--only", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+	parser.add_argument("--detail", choices=list(TARGETS),
+		help="print the slowest packages imported by one target instead")
+	parser.add_argument("--output", help="JSON file to write the results to")
+	args = parser.parse_args(argv)
+	if args.detail:
+		for seconds, name in detail(TARGETS[args.detail]):
+			print(f"{seconds:8.3f} s  {name}")
+		return
+	results = {}
+	for name in args.only:
+		results[name] = time_import(TARGETS[name], args.repeat)
+		print(f"{name:<16} {results[name]['seconds']:8.3f} s  {' '.join(results[name]['loaded'])}")
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(results, f, indent=2)
+		print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,266 @@
+"""
+Benchmark suite for the visualization entry points. Reports wall time and
+memory of every stage of treemap, animate_treemap, sunburst_matrix and
+colored_map, and stores the results as JSON so runs can be compared
+between commits. max_rss_mb is the process max RSS so far after each
+stage and rss_growth_mb how much the stage raised it, which is 0 for a
+stage that stays below an earlier peak. --trace-memory also records
+traced_mb, the traced Python/NumPy peak of each stage above what was
+allocated when it started, at a large cost in wall time. Run from the
+repository root:
+
+	python benchmarks/run.py                          # sample_data
+	python benchmarks/run.py --scale 10               # 10x cohorts, years and gridcells
+	python benchmarks/run.py --cohorts 100 --only treemap
+	python benchmarks/run.py --compare old.json new.json
+
+sunburst_matrix gif frames need a working plotly static image export
+(kaleido); if it is unavailable that stage is recorded as an error.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from fates_visualization.files import Files
+from fates_visualization.treemap_utils import pre_process, carea_allom
+from fates_visualization.treemap import TreemapFigure, animate_treemap
+from fates_visualization.sunburst_matrix import sunburst_matrix, scpf_param
+from fates_visualization.colored_map import colored_map
+from fates_visualization.frames import FrameWriter, figure_to_rgb
+from fates_visualization.layout import TreemapLayout
+from synthetic import make_run, make_grid
+
+ENTRIES = ["treemap", "animate_treemap", "sunburst_matrix", "colored_map"]
+SUNBURST_VARS = {"understory": "NPLANT_UNDERSTORY_SCPF", "canopy": "NPLANT_CANOPY_SCPF"}
+
+
+class Stages:
+	"""accumulates wall time and memory per stage"""
+
+	def __init__(self):
+		self.results = {}
+
+	@contextmanager
+	def __call__(self, name):
+		tracing = tracemalloc.is_tracing()
+		if tracing:
+			tracemalloc.reset_peak()
+			base = tracemalloc.get_traced_memory()[0]
+		rss = max_rss_mb()
+		start = time.perf_counter()
+		try:
+			yield
+		except Exception as e:
+			self.results[name] = {"error": repr(e)}
+			return
+		seconds = time.perf_counter() - start
+		result = self.results.setdefault(name,
+			{"seconds": 0., "max_rss_mb": 0., "rss_growth_mb": 0., "calls": 0})
+		result["seconds"] += seconds
+		result["max_rss_mb"] = max_rss_mb()
+		result["rss_growth_mb"] += result["max_rss_mb"] - rss
+		if tracing:
+			traced = (tracemalloc.get_traced_memory()[1] - base) / 2**20
+			result["traced_mb"] = max(result.get("traced_mb", 0.), traced)
+		result["calls"] += 1
+
+
+def max_rss_mb():
+	"""the largest resident set size of this process so far"""
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def bench_treemap(run, mode, year=1):
+	stage = Stages()
+	rest_folder, param_path, _ = run
+	with stage("load"):
+		files = Files(rest_folder, param_path, address="absolute")
+		files.restart[year]
+	with stage("allometry"):
+		carea_allom(files.restart[year], files.param)
+	with stage("preprocess"):
+		df1, df2 = pre_process(files, year, mode)
+	with stage("layout"):
+		TreemapLayout()(df2['patch_area'].to_numpy())
+	with stage("render"):
+		fig = TreemapFigure(mode)
+		fig.update(df1, df2, year)
+		fig.fig.canvas.draw()
+	with stage("encode"):
+		fig.fig.savefig(io.BytesIO(), format="png")
+	plt.close(fig.fig)
+	files.close()
+	return stage.results
+
+
+def bench_animate_treemap(run, mode, out):
+	stage = Stages()
+	rest_folder, param_path, _ = run
+	with stage("load"):
+		files = Files(rest_folder, param_path, address="absolute")
+	fig = TreemapFigure(mode)
+	with FrameWriter(f"{out}/stages.gif") as writer:
+		for year in files.restart:
+			with stage("preprocess"):
+				df1, df2 = pre_process(files, year, mode)
+			with stage("render"):
+				fig.update(df1, df2, year)
+				frame = figure_to_rgb(fig.fig)
+			with stage("encode"):
+				writer.append(frame, year)
+	plt.close(fig.fig)
+	with stage("total"):
+		animate_treemap(files, mode, out, "animated")
+	files.close()
+	return stage.results
+
+
+def bench_sunburst_matrix(run, out, gif=True):
+	stage = Stages()
+	_, _, hist_path = run
+	with stage("load"):
+		files = Files(hist_path=hist_path)
+	num_years = files.hist.variables[SUNBURST_VARS["canopy"]].shape[0] - 1
+	with stage("preprocess"):
+		scpf_param([[("run", files)]], SUNBURST_VARS, ["Pine", "Cedar"], range(1, num_years + 1))
+	with stage("render_html"):
+		sunburst_matrix([[("run", files)]], SUNBURST_VARS, ["Pine", "Cedar"], "sunburst",
+			mode="interactive", path=out)
+	if gif:
+		with stage("render_gif"):
+			sunburst_matrix([[("run", files)]], SUNBURST_VARS, ["Pine", "Cedar"], "sunburst",
+				mode="gif", path=out)
+	return stage.results
+
+
+def bench_colored_map(grid, out):
+	stage = Stages()
+	param_path, hist_path = grid
+	with stage("load"):
+		files = Files(param_path=param_path, hist_path=hist_path)
+	with stage("render_html"):
+		colored_map(files, "TLAI", "benchmark", "benchmark", "map", mode="interactive", path=out)
+	return stage.results
+
+
+def git_commit():
+	try:
+		return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT,
+			stderr=subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def run_suite(cohorts=1, years=1, gridcells=1, only=ENTRIES, mode="basic", gif=True,
+	trace_memory=False):
+	report = {"commit": git_commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": platform.python_version(),
+		"scale": {"cohorts": cohorts, "years": years, "gridcells": gridcells},
+		"mode": mode, "results": {}}
+	if trace_memory:
+		tracemalloc.start()
+	with tempfile.TemporaryDirectory() as tmp:
+		if (cohorts, years, gridcells) == (1, 1, 1):
+			sample = os.path.join(ROOT, "sample_data")
+			run = (os.path.join(sample, "restart"), os.path.join(sample, "sample_param.nc"),
+				os.path.join(sample, "sample_hist.nc"))
+		else:
+			run = make_run(os.path.join(tmp, "run"), cohorts, years, gridcells,
+				os.path.join(ROOT, "sample_data"))
+		results = report["results"]
+		if "treemap" in only:
+			results["treemap"] = bench_treemap(run, mode)
+		if "animate_treemap" in only:
+			results["animate_treemap"] = bench_animate_treemap(run, mode, tmp)
+		if "sunburst_matrix" in only:
+			results["sunburst_matrix"] = bench_sunburst_matrix(run, tmp, gif)
+		if "colored_map" in only:
+			grid = make_grid(os.path.join(tmp, "grid"), gridcells)
+			results["colored_map"] = bench_colored_map(grid, tmp)
+	if trace_memory:
+		tracemalloc.stop()
+	return report
+
+
+def print_report(report):
+	print(f"commit {report['commit']}  scale {report['scale']}")
+	for entry, stages in report["results"].items():
+		print(entry)
+		for name, result in stages.items():
+			if "error" in result:
+				print(f"  {name:<12} error: {result['error']}")
+			else:
+				traced = f" {result['traced_mb']:10.1f} MB traced" if "traced_mb" in result else ""
+				print(f"  {name:<12} {result['seconds']:10.3f} s {result['rss_growth_mb']:+10.1f} MB "
+					f"(max RSS {result['max_rss_mb']:.1f} MB){traced}")
+
+
+def compare(old_path, new_path):
+	"""prints the change of every stage between two stored reports"""
+	with open(old_path) as f:
+		old = json.load(f)
+	with open(new_path) as f:
+		new = json.load(f)
+	print(f"{old['commit']} -> {new['commit']}")
+	for entry, stages in new["results"].items():
+		print(entry)
+		for name, result in stages.items():
+			before = old["results"].get(entry, {}).get(name, {})
+			if "seconds" not in result or "seconds" not in before:
+				continue
+			# the per-stage traced peak when both runs traced memory, else the
+			# growth of the process max RSS
+			key = "traced_mb" if "traced_mb" in result and "traced_mb" in before else "rss_growth_mb"
+			memory = ""
+			if key in result and key in before:
+				memory = f"   {before[key]:8.1f} MB -> {result[key]:8.1f} MB {key}"
+			print(f"  {name:<12} {before['seconds']:10.3f} s -> {result['seconds']:10.3f} s "
+				f"({result['seconds'] / max(before['seconds'], 1e-9):6.2f}x){memory}")
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument("--scale", type=int, help="scale cohorts, years and gridcells alike")
+	parser.add_argument("--cohorts", type=int, default=1)
+	parser.add_argument("--years", type=int, default=1)
+	parser.add_argument("--gridcells", type=int, default=1)
+	parser.add_argument("--mode", default="basic", help="treemap mode")
+	parser.add_argument("--only", nargs="+", choices=ENTRIES, default=ENTRIES)
+	parser.add_argument("--no-gif", action="store_true", help="skip sunburst gif export")
+	parser.add_argument("--trace-memory", action="store_true",
+		help="also trace per-stage Python/NumPy allocations (slow)")
+	parser.add_argument("--output", help="JSON file to write, default bench_<commit>.json")
+	parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+	args = parser.parse_args(argv)
+	if args.compare:
+		compare(*args.compare)
+		return
+	if args.scale:
+		args.cohorts = args.years = args.gridcells = args.scale
+	report = run_suite(args.cohorts, args.years, args.gridcells, args.only, args.mode,
+		not args.no_gif, args.trace_memory)
+	print_report(report)
+	output = args.output or f"bench_{(report['commit'] or 'local')[:8]}.json"
+	with open(output, "w") as f:
+		json.dump(report, f, indent=2)
+	print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,113 @@
+"""
+Synthetic FATES runs for benchmarking, built by tiling sample_data along
+the cohort, year and gridcell axes.
+"""
+import os
+import shutil
+import numpy as np
+import netCDF4 as nc
+
+RESTART_VARIABLES = ['fates_pft', 'fates_dbh', 'fates_height', 'fates_nplant',
+	'fates_canopy_layer', 'fates_area', 'fates_age', 'fates_CohortsPerPatch',
+	'fates_spread', 'fates_PatchesPerSite']
+HISTORY_VARIABLES = ['NPLANT_CANOPY_SCPF', 'NPLANT_UNDERSTORY_SCPF']
+
+
+def _copy_dims(src, dst, sizes):
+	for name, dim in src.dimensions.items():
+		if name in sizes or not dim.isunlimited():
+			dst.createDimension(name, sizes.get(name, len(dim)))
+		else:
+			dst.createDimension(name, None)
+
+
+def scale_restart(src_path, dst_path, cohorts=1, gridcells=1):
+	"""
+	Writes a copy of the restart file at SRC_PATH with every site's cohort
+	vector tiled COHORTS times (multiplying patches and cohorts) and the
+	sites tiled GRIDCELLS times
+	"""
+	with nc.Dataset(src_path) as src, nc.Dataset(dst_path, "w") as dst:
+		ncol = len(src.dimensions['column'])
+		ncohort = len(src.dimensions['cohort'])
+		_copy_dims(src, dst, {'column': ncol * gridcells, 'cohort': ncohort * cohorts * gridcells})
+		for name in RESTART_VARIABLES:
+			var = src.variables[name]
+			values = np.ma.filled(var[:], 0)
+			if var.dimensions == ('cohort',):
+				values = np.tile(values.reshape(ncol, -1), (gridcells, cohorts)).ravel()
+			else:
+				values = np.tile(values, gridcells)
+			if name == 'fates_PatchesPerSite':
+				values = values * cohorts
+			dst.createVariable(name, var.dtype, var.dimensions)[:] = values
+
+
+def scale_history(src_path, dst_path, years=1, gridcells=1, variables=HISTORY_VARIABLES):
+	"""
+	Writes a copy of VARIABLES (and the fates_lev* maps) of the history
+	file at SRC_PATH with the time axis tiled YEARS times and the gridcells
+	tiled GRIDCELLS times
+	"""
+	with nc.Dataset(src_path) as src, nc.Dataset(dst_path, "w") as dst:
+		ntime = len(src.dimensions['time'])
+		nland = len(src.dimensions['lndgrid'])
+		_copy_dims(src, dst, {'time': ntime * years, 'lndgrid': nland * gridcells})
+		names = [name for name, var in src.variables.items()
+			if len(var.dimensions) == 1 and var.dimensions[0].startswith('fates_lev')]
+		for name in names + ['time'] + list(variables):
+			var = src.variables[name]
+			reps = [years if dim == 'time' else gridcells if dim == 'lndgrid' else 1
+				for dim in var.dimensions]
+			dst.createVariable(name, var.dtype, var.dimensions)[:] = np.tile(var[:], reps)
+
+
+def make_run(folder, cohorts=1, years=1, gridcells=1, sample="sample_data"):
+	"""
+	Builds a scaled copy of the sample run in FOLDER and returns the
+	restart folder, parameter file and history file paths
+	"""
+	rest_folder = os.path.join(folder, "restart")
+	os.makedirs(rest_folder, exist_ok=True)
+	sources = sorted(os.path.join(sample, "restart", name)
+		for name in os.listdir(os.path.join(sample, "restart")) if name.endswith(".nc"))
+	for year in range(len(sources) * years):
+		src = sources[year % len(sources)]
+		dst = os.path.join(rest_folder, f"synthetic.clm2.r.{1000 + year:04d}-01-01-00000.nc")
+		scale_restart(src, dst, cohorts, gridcells)
+	param_path = os.path.join(folder, "param.nc")
+	shutil.copy(os.path.join(sample, "sample_param.nc"), param_path)
+	hist_path = os.path.join(folder, "hist.nc")
+	scale_history(os.path.join(sample, "sample_hist.nc"), hist_path, years, gridcells)
+	return rest_folder, param_path, hist_path
+
+
+def make_grid(folder, gridcells=1, ntime=12, side=20, seed=0):
+	"""
+	Builds a regional grid of about SIDE**2 * GRIDCELLS cells for
+	colored_map and returns the parameter and history file paths. Roughly
+	a quarter of the cells are masked, like ocean cells in a real grid
+	"""
+	os.makedirs(folder, exist_ok=True)
+	n = int(round(side * np.sqrt(gridcells)))
+	rng = np.random.default_rng(seed)
+	lon0, lat0 = np.meshgrid(-125 + np.arange(n) * 0.1, 35 + np.arange(n) * 0.1)
+	offsets = np.array([[0, 0], [0.1, 0], [0.1, 0.1], [0, 0.1]])
+	param_path = os.path.join(folder, "grid_param.nc")
+	with nc.Dataset(param_path, "w") as dst:
+		dst.createDimension('lsmlat', n)
+		dst.createDimension('lsmlon', n)
+		dst.createDimension('nv', 4)
+		dst.createVariable('xv', 'f8', ('lsmlat', 'lsmlon', 'nv'))[:] = lon0[..., None] + offsets[:, 0]
+		dst.createVariable('yv', 'f8', ('lsmlat', 'lsmlon', 'nv'))[:] = lat0[..., None] + offsets[:, 1]
+	hist_path = os.path.join(folder, "grid_hist.nc")
+	with nc.Dataset(hist_path, "w") as dst:
+		dst.createDimension('time', None)
+		dst.createDimension('lat', n)
+		dst.createDimension('lon', n)
+		dst.createVariable('time', 'f4', ('time',))[:] = np.arange(ntime) * 365.
+		values = rng.random((ntime, n, n))
+		mask = np.broadcast_to(rng.random((n, n)) < 0.25, values.shape)
+		var = dst.createVariable('TLAI', 'f4', ('time', 'lat', 'lon'), fill_value=1e36)
+		var[:] = np.ma.masked_array(values, mask)
+	return param_path, hist_path
@@ -0,0 +1,48 @@
+"""
+Visualization tools for FATES restart, parameter and history files.
+
+The core, file access (files) and the numeric pipeline (allometry,
+treemap_utils, multiplex, layout, store, cache), only needs numpy,
+netCDF4 and pandas. The renderers, treemap (matplotlib) and
+sunburst_matrix and colored_map (plotly), load their plotting backends
+when they are imported, and export and frames load matplotlib and the
+image encoders only when they render or encode.
+
+Names below are imported from their module on first access, so
+"import fates_visualization" loads nothing but this file.
+"""
+from importlib import import_module
+
+# name: module it is imported from
+_EXPORTS = {
+	'Files': 'files', 'History': 'files', 'RestartCatalog': 'files', 'DatasetPool': 'files',
+	'PooledDataset': 'files',
+	'allom_params': 'allometry', 'crown_area': 'allometry',
+	'pre_process': 'treemap_utils', 'read_cohorts': 'treemap_utils',
+	'cohort_tables': 'treemap_utils', 'site_tables': 'treemap_utils',
+	'patch_table': 'treemap_utils', 'SMALL_PATCH_AREA': 'treemap_utils',
+	'reduce_multiplexed': 'multiplex', 'reduce_runs': 'multiplex',
+	'clear_reductions': 'multiplex',
+	'TreemapLayout': 'layout',
+	'CohortStore': 'store',
+	'PreprocessCache': 'cache',
+	'TreemapFigure': 'treemap', 'animate_treemap': 'treemap', 'batch_treemap': 'treemap',
+	'scpf_param': 'sunburst_matrix',
+	'animate_colored_map': 'colored_map',
+	'ExportService': 'export',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+	# treemap, sunburst_matrix and colored_map are the names of their
+	# modules, import them from there
+	if name not in _EXPORTS:
+		raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+	value = getattr(import_module(f".{_EXPORTS[name]}", __name__), name)
+	globals()[name] = value
+	return value
+
+def __dir__():
+	return sorted(set(globals()) | set(_EXPORTS))
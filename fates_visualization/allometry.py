@@ -0,0 +1,73 @@
+import numpy as np
+
+ALLOM_VARIABLES = ['fates_allom_d2bl2', 'fates_allom_d2ca_coefficient_max',
+	'fates_allom_d2ca_coefficient_min', 'fates_allom_blca_expnt_diff',
+	'fates_allom_dbh_maxheight']
+
+
+def allom_params(paramfin):
+	"""
+	PARAMFIN: a parameter file
+	Returns a dict of PFT-indexed allometry parameter arrays, with a
+	placeholder row at index 0 so that raw fates_pft values can be used
+	as indices directly (pft 0 marks an empty cohort slot)
+	"""
+	fates_allom_cmode = paramfin.variables['fates_allom_cmode'][:] # coarse root biomass allometry function index
+	if np.any(fates_allom_cmode != 1):
+		raise Exception
+	params = {}
+	for name in ALLOM_VARIABLES:
+		values = np.ma.filled(paramfin.variables[name][:].astype(float), np.nan)
+		params[name] = np.concatenate(([np.nan], values))
+	return params
+
+
+def site_index(ncohorts, nsites):
+	"""
+	Returns the site (column) index of every slot in a cohort vector of
+	length NCOHORTS, which FATES lays out as NSITES equal-sized blocks
+	"""
+	return np.arange(ncohorts) // (ncohorts // max(nsites, 1))
+
+
+def crown_area(pft, dbh, nplant, spread, params):
+	"""
+	Vectorized crown area allometry
+	PFT, DBH, NPLANT: cohort arrays, either (ncohorts,) for one restart
+		file or (nyears, ncohorts) for several restart years stacked together
+	SPREAD: fates_spread, either a scalar, one value per site, or one
+		value per site for every stacked year
+	PARAMS: dict returned by allom_params
+	Returns a masked array shaped like PFT, masked on empty (pft == 0)
+	and masked cohort slots
+	"""
+	pft = np.ma.asarray(pft)
+	empty = np.ma.getmaskarray(pft) | (np.ma.filled(pft, 0) <= 0)
+	index = np.where(empty, 0, np.ma.filled(pft, 0)).astype(int)
+
+	spread = np.ma.filled(np.asarray(spread, dtype=float), 0.)
+	if spread.ndim and spread.shape[-1] > 1:
+		spread = np.take(spread, site_index(pft.shape[-1], spread.shape[-1]), axis=-1)
+	elif spread.ndim:
+		spread = spread[..., :1]
+
+	d2ca_coeff = params['fates_allom_d2ca_coefficient_max'][index] * spread + \
+		params['fates_allom_d2ca_coefficient_min'][index] * (1. - spread)
+	eff_dbh = np.minimum(np.ma.filled(dbh, 0.), params['fates_allom_dbh_maxheight'][index])
+	exponent = params['fates_allom_d2bl2'][index] + params['fates_allom_blca_expnt_diff'][index]
+	with np.errstate(invalid='ignore'):
+		carea = d2ca_coeff * eff_dbh ** exponent * np.ma.filled(nplant, 0.)
+	return np.ma.masked_array(carea, mask=empty)
+
+
+def carea_stack(rest_fins, paramfin):
+	"""
+	REST_FINS: a list of restart files from the same run
+	PARAMFIN: a parameter file
+	Returns crown areas of all restart years as one (nyears, ncohorts)
+	masked array, computed in a single pass
+	"""
+	def stack(name):
+		return np.ma.stack([rest_fin.variables[name][:] for rest_fin in rest_fins])
+	return crown_area(stack('fates_pft'), stack('fates_dbh'), stack('fates_nplant'),
+		stack('fates_spread'), allom_params(paramfin))
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import pandas as pd
+from .treemap_utils import pre_process
+from .instrument import count
+
+# bump when pre_process output changes so stale entries are not reused
+CACHE_VERSION = 3
+
+
+class PreprocessCache:
+	"""
+	On-disk cache of the (df1, df2) tables pre_process returns, stored as
+	Parquet files in CACHE_DIR (requires pyarrow). Entries are keyed on the
+	restart file path and mtime, the parameter file path and mtime and the
+	treemap mode, so a warm lookup never opens the NetCDF files. Every file
+	of an entry is written under a temporary name and moved into place, the
+	.json sidecar last, so an entry is complete once its sidecar exists and
+	an interrupted store leaves no entry behind.
+	"""
+
+	def __init__(self, cache_dir=".fates_cache"):
+		self.cache_dir = cache_dir
+		os.makedirs(cache_dir, exist_ok=True)
+
+	def key(self, files, year, mode):
+		rest_path = os.path.abspath(files.restart.path(year))
+		param_path = os.path.abspath(files.param.filepath())
+		parts = [CACHE_VERSION, rest_path, os.stat(rest_path).st_mtime_ns,
+			param_path, os.stat(param_path).st_mtime_ns, mode]
+		return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+	def _paths(self, key):
+		base = os.path.join(self.cache_dir, key)
+		return f"{base}.df1.parquet", f"{base}.df2.parquet", f"{base}.json"
+
+	def load(self, files, year, mode="basic"):
+		"""the cached tables of YEAR, or None on a miss"""
+		df1_path, df2_path, meta_path = self._paths(self.key(files, year, mode))
+		return _read(meta_path, df1_path, df2_path)
+
+	def load_patches(self, files, year, mode="basic"):
+		"""the cached patch table (df2) of YEAR alone, or None on a miss"""
+		_, df2_path, meta_path = self._paths(self.key(files, year, mode))
+		tables = _read(meta_path, df2_path)
+		return None if tables is None else tables[0]
+
+	def store(self, files, year, mode, df1, df2):
+		key = self.key(files, year, mode)
+		df1_path, df2_path, meta_path = self._paths(key)
+		_replace(df1_path, df1.to_parquet)
+		_replace(df2_path, df2.to_parquet)
+		meta = {"restart": os.path.abspath(files.restart.path(year)), "year": year, "mode": mode}
+		def write_meta(path):
+			with open(path, "w") as f:
+				json.dump(meta, f)
+		_replace(meta_path, write_meta)
+
+	def get(self, files, year, mode="basic"):
+		"""cached pre_process(FILES, YEAR, MODE), computed and stored on a miss"""
+		cached = self.load(files, year, mode)
+		count("cache_hits" if cached is not None else "cache_misses")
+		if cached is not None:
+			return cached
+		df1, df2 = pre_process(files, year, mode)
+		self.store(files, year, mode, df1, df2)
+		return df1, df2
+
+	def prewarm(self, files, modes=("basic",), years=None):
+		"""preprocess and cache YEARS (default: every year) of a run in MODES"""
+		for year in years or files.restart:
+			for mode in modes:
+				if self.load(files, year, mode) is None:
+					self.get(files, year, mode)
+
+	def invalidate(self, files=None):
+		"""
+		remove the cached entries of every restart file in FILES, or the
+		whole cache if FILES is not passed in
+		"""
+		if files is None:
+			# every entry, with the files of interrupted stores
+			for name in os.listdir(self.cache_dir):
+				if name.endswith((".parquet", ".json", ".tmp")):
+					os.remove(os.path.join(self.cache_dir, name))
+			return
+		paths = {os.path.abspath(files.restart.path(year)) for year in files.restart}
+		for name in os.listdir(self.cache_dir):
+			if not name.endswith(".json"):
+				continue
+			key = name[:-len(".json")]
+			with open(os.path.join(self.cache_dir, name)) as f:
+				if json.load(f)["restart"] not in paths:
+					continue
+			for path in self._paths(key):
+				if os.path.exists(path):
+					os.remove(path)
+
+
+def _read(meta_path, *paths):
+	"""the tables in PATHS if META_PATH marks their entry complete, else None"""
+	if not os.path.exists(meta_path):
+		return None
+	try:
+		return tuple(pd.read_parquet(path) for path in paths)
+	except Exception:
+		# a damaged or vanished entry is a miss, get() stores it again
+		return None
+
+
+def _replace(path, write):
+	"""calls WRITE with a temporary path, then moves the file to PATH"""
+	tmp = f"{path}.{os.getpid()}.tmp"
+	try:
+		write(tmp)
+		os.replace(tmp, path)
+	except BaseException:
+		if os.path.exists(tmp):
+			os.remove(tmp)
+		raise
@@ -0,0 +1,149 @@
+import plotly.graph_objects as go
+import numpy as np
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from .export import ExportService
+from .instrument import stage, timed
+
+# feature collections built most recently, keyed on grid and cell mask,
+# least recently used first, at most MAX_FEATURES of them
+MAX_FEATURES = 8
+_features = OrderedDict()
+
+@timed("colored_map", "mode")
+def colored_map(files, var, token, title, file_name, mode="interactive", path="",
+				center={"lat": 39.5, "lon": -121}, zoom=5.5, w=500, h=800, geojson_file=None,
+				exporter=None):
+	param = files.param
+	var = files.history.read([var], time=0)[var][0]
+	extra = "/"
+	if not path:
+		extra = ""
+
+	with stage("preprocess"):
+		feature_collection, cells = grid_features(param, ~np.ma.getmaskarray(var))
+		values = np.ma.filled(var, 0).ravel()[cells]
+		shown = values != 0
+		# static exports need the geometry itself, not a reference to a file
+		if geojson_file and mode == "interactive":
+			feature_collection = write_features(param, f"{path}{extra}", geojson_file)
+
+	with stage("render"):
+		fig = go.Figure(go.Choroplethmapbox(geojson=feature_collection, 
+			locations=cells[shown], z=values[shown],
+			colorscale="viridis", marker_line_width=0, marker_opacity=0.95))
+		fig.update_layout(mapbox_center = center, mapbox_zoom=zoom,
+	                 mapbox_style="streets", mapbox_accesstoken=token)
+		fig.update_layout(width=w, height=h, title=title)
+	if mode == "interactive":
+		with stage("encode"):
+			fig.write_html(f"{path}{extra}{file_name}.html")
+	else:
+		exporter = exporter or ExportService("kaleido")
+		exporter.write_image(fig, f"{path}{extra}{file_name}.png", scale=4)
+	return fig
+
+
+@timed()
+def animate_colored_map(files, var, token, title, file_name, path="", timesteps=None,
+				center={"lat": 39.5, "lon": -121}, zoom=5.5, w=500, h=800, geojson_file=None,
+				frame_duration=200):
+	"""
+	Plots VAR over the time axis of the history file as an html map with a
+	slider and play button. The polygons are sent once with the first
+	timestep and every frame only carries the values of one timestep.
+	TIMESTEPS: indices along the time axis (default: all of them)
+	"""
+	extra = "/"
+	if not path:
+		extra = ""
+	shape = files.history.shape(var)
+	if timesteps is None:
+		timesteps = range(shape[0])
+	timesteps = list(timesteps)
+	data = files.history.read([var], time=timesteps)[var]
+	data = data.reshape(len(timesteps), -1)
+
+	# a cell is drawn if it has a value at any timestep, zeros are hidden
+	feature_collection, cells = grid_features(files.param,
+		~np.ma.getmaskarray(data).all(0).reshape(shape[1:]))
+	values = np.ma.filled(data[:, cells].astype(float), np.nan)
+	values[values == 0] = np.nan
+	zmin, zmax = np.nanmin(values), np.nanmax(values)
+	if geojson_file:
+		feature_collection = write_features(files.param, f"{path}{extra}", geojson_file)
+
+	fig = go.Figure(go.Choroplethmapbox(geojson=feature_collection, 
+		locations=cells, z=values[0], zmin=zmin, zmax=zmax,
+		colorscale="viridis", marker_line_width=0, marker_opacity=0.95),
+		frames=[go.Frame(data=[go.Choroplethmapbox(z=z)], traces=[0], name=str(t))
+			for t, z in zip(timesteps, values)])
+	fig.update_layout(mapbox_center = center, mapbox_zoom=zoom,
+                 mapbox_style="streets", mapbox_accesstoken=token)
+	fig.update_layout(width=w, height=h, title=title)
+	play = dict(frame=dict(duration=frame_duration, redraw=True), fromcurrent=True,
+		transition=dict(duration=0), mode="immediate")
+	fig.update_layout(
+		updatemenus=[dict(type="buttons", showactive=False, x=0.05, y=0, xanchor="right",
+			buttons=[dict(label="Play", method="animate", args=[None, play]),
+				dict(label="Pause", method="animate",
+					args=[[None], dict(play, frame=dict(duration=0, redraw=False))])])],
+		sliders=[dict(currentvalue={"prefix": "Timestep: "}, pad={"t": 50},
+			steps=[dict(method="animate", label=str(t), args=[[str(t)], play])
+				for t in timesteps])])
+	fig.write_html(f"{path}{extra}{file_name}.html")
+	return fig
+
+
+def grid_features(param, valid):
+	"""
+	PARAM: a parameter file with the cell vertices xv and yv (lat, lon, 4)
+	VALID: boolean (lat, lon) mask of the cells to include
+	Returns a GeoJSON feature collection with one polygon per valid cell,
+	with ids of the flat cell index, and the flat indices of those cells.
+	Built in bulk and the MAX_FEATURES most recently used are cached per
+	grid and mask, so several variables or timesteps on the same grid
+	reuse it
+	"""
+	valid = np.asarray(valid, dtype=bool)
+	path = param.filepath()
+	key = (path, os.stat(path).st_mtime_ns,
+		hashlib.sha1(np.packbits(valid).tobytes()).hexdigest(), valid.shape)
+	if key in _features:
+		_features.move_to_end(key)
+		return _features[key]
+	vlon = param.variables["xv"][:]
+	vlat = param.variables["yv"][:]
+	valid = valid & ~np.ma.getmaskarray(vlon).any(-1) & ~np.ma.getmaskarray(vlat).any(-1)
+	cells = np.flatnonzero(valid)
+	rings = np.stack([np.ma.filled(vlon, 0)[valid], np.ma.filled(vlat, 0)[valid]], -1)
+	rings = np.concatenate([rings, rings[:, :1]], 1).tolist() # close each ring
+	feature_collection = {"type": "FeatureCollection", "features": [
+		{"type": "Feature", "id": int(cell), "geometry": {"type": "Polygon", "coordinates": [ring]}}
+		for cell, ring in zip(cells, rings)]}
+	_features[key] = feature_collection, cells
+	while len(_features) > MAX_FEATURES:
+		_features.popitem(last=False)
+	return feature_collection, cells
+
+
+def write_features(param, folder, geojson_file):
+	"""
+	writes the polygons of every cell of the grid of PARAM to
+	FOLDER/GEOJSON_FILE and returns the relative reference figures use in
+	place of the embedded geometry. The file does not depend on the cells
+	a map shows, those are selected by its locations, so maps of the same
+	grid share it. It is rewritten if it holds another grid
+	"""
+	feature_collection, _ = grid_features(param, np.ones(param.variables["xv"].shape[:-1], dtype=bool))
+	text = json.dumps(feature_collection)
+	target = folder + geojson_file
+	if os.path.exists(target):
+		with open(target) as f:
+			if f.read() == text:
+				return geojson_file
+	with open(target, "w") as f:
+		f.write(text)
+	return geojson_file
@@ -0,0 +1,270 @@
+import io
+import json
+import importlib.util
+from functools import partial
+import numpy as np
+from .frames import figure_to_rgb, ordered_map, spawn_pool
+from .instrument import stage, install
+
+RENDERERS = ("kaleido", "matplotlib", "auto")
+# plotly's default trace colors
+COLORWAY = ['#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A', '#19d3f3', '#FF6692',
+	'#B6E880', '#FF97FF', '#FECB52']
+# plotly sizes are in pixels, matplotlib's in points at 100 dpi
+PX = 0.72
+
+
+class ExportService:
+	"""
+	Static image export of plotly figures that keeps its renderers alive
+	between figures and between calls.
+	RENDERER: "kaleido" for plotly's own export through a long-lived
+		Kaleido process, "matplotlib" to draw the Sunburst and
+		Choroplethmapbox traces with matplotlib, which needs no browser and
+		no network (maps are drawn without a basemap), or "auto" for kaleido
+		when it is installed and matplotlib otherwise
+	WORKERS: number of processes map() exports with, each keeping its own
+		renderer. The pool is started on first use and kept until close()
+	BATCH: number of figures a worker renders per round-trip
+	SCALE: image scale factor
+	"""
+
+	def __init__(self, renderer="auto", workers=1, batch=8, scale=1):
+		assert renderer in RENDERERS, f"renderer must be one of {RENDERERS}"
+		if renderer == "auto":
+			renderer = "kaleido" if importlib.util.find_spec("kaleido") else "matplotlib"
+		self.renderer = renderer
+		self.workers = workers
+		self.batch = batch
+		self.scale = scale
+		self.pool = None
+
+	def to_png(self, fig, scale=None):
+		"""the plotly figure FIG as png bytes"""
+		scale = self.scale if scale is None else scale
+		with stage("render", renderer=self.renderer):
+			if self.renderer == "kaleido":
+				# plotly keeps one Kaleido process per interpreter alive
+				return fig.to_image(format="png", scale=scale)
+			buffer = io.BytesIO()
+			matplotlib_figure(fig, scale).savefig(buffer, format="png")
+			return buffer.getvalue()
+
+	def to_rgb(self, fig, scale=None):
+		"""the plotly figure FIG as an RGB array"""
+		with stage("render", renderer=self.renderer):
+			if self.renderer == "kaleido":
+				import imageio
+				return imageio.imread(self.to_png(fig, scale))[..., :3]
+			return figure_to_rgb(matplotlib_figure(fig, self.scale if scale is None else scale))
+
+	def write_image(self, fig, path, scale=None):
+		image = self.to_png(fig, scale)
+		with stage("encode"):
+			with open(path, "wb") as f:
+				f.write(image)
+
+	def map(self, make_figure, items):
+		"""
+		Generator of the RGB arrays of the figures MAKE_FIGURE(item) of
+		every item in ITEMS, in order. With several workers, figures are
+		built and exported in the worker processes, so MAKE_FIGURE must be
+		picklable
+		"""
+		if self.workers <= 1:
+			for item in items:
+				yield self.to_rgb(make_figure(item))
+			return
+		if self.pool is None:
+			self.pool = spawn_pool(self.workers, _init_worker, (self.renderer, self.scale))
+		render = partial(_render_batch, make_figure)
+		for frames in ordered_map(self.pool, render, _batches(items, self.batch), 2 * self.workers):
+			yield from frames
+
+	def close(self):
+		"""stops the worker processes"""
+		if self.pool is not None:
+			self.pool.shutdown()
+			self.pool = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['pool'] = None
+		return state
+
+
+# per-process state of ExportService workers
+_worker = {}
+
+def _init_worker(renderer, scale, sinks=()):
+	install(sinks)
+	_worker['service'] = ExportService(renderer, scale=scale)
+
+def _render_batch(make_figure, items):
+	return [_worker['service'].to_rgb(make_figure(item)) for item in items]
+
+def _batches(items, size):
+	batch = []
+	for item in items:
+		batch.append(item)
+		if len(batch) == size:
+			yield batch
+			batch = []
+	if batch:
+		yield batch
+
+
+def matplotlib_figure(fig, scale=1):
+	"""
+	Draws the plotly figure FIG with matplotlib: its Sunburst and
+	Choroplethmapbox traces, annotations (such as subplot titles) and
+	title, at the size plotly would export it
+	"""
+	# matplotlib is only imported when this renderer is used
+	from matplotlib.figure import Figure
+	from matplotlib.backends.backend_agg import FigureCanvasAgg
+	from matplotlib.collections import PatchCollection
+	layout = fig.layout
+	width, height = layout.width or 700, layout.height or 500
+	out = Figure(figsize=(width / 100, height / 100), dpi=100 * scale, facecolor="white")
+	FigureCanvasAgg(out)
+	margin = [getattr(layout.margin, side) for side in "lrtb"]
+	left, right, top, bottom = [m if m is not None else d for m, d in zip(margin, [80, 80, 100, 80])]
+	x0, y0 = left / width, bottom / height
+	dx, dy = 1 - (left + right) / width, 1 - (top + bottom) / height
+
+	def area(domain):
+		xs, ys = domain.x or (0, 1), domain.y or (0, 1)
+		return [x0 + xs[0] * dx, y0 + ys[0] * dy, (xs[1] - xs[0]) * dx, (ys[1] - ys[0]) * dy]
+
+	# sunbursts are drawn on one axes in pixels, as one collection of wedges
+	canvas = out.add_axes([0, 0, 1, 1], xlim=(0, width), ylim=(0, height))
+	canvas.axis("off")
+	wedges = []
+	for trace in fig.data:
+		if trace.type == "sunburst":
+			x, y, w, h = area(trace.domain)
+			wedges += _draw_sunburst(canvas, trace, ((x + w / 2) * width, (y + h / 2) * height),
+				min(w * width, h * height) / 2)
+		elif trace.type == "choroplethmapbox":
+			_draw_choropleth(out, trace, area(layout.mapbox.domain), layout.mapbox, width, height)
+		else:
+			raise ValueError(f"the matplotlib renderer cannot draw {trace.type} traces")
+	canvas.add_collection(PatchCollection(wedges, match_original=True), autolim=False)
+	for note in layout.annotations:
+		x = x0 + note.x * dx if note.xref != "x" else note.x
+		y = y0 + note.y * dy if note.yref != "y" else note.y
+		out.text(x, y, note.text, fontsize=(note.font.size or 16) * PX, color="#2a3f5f",
+			ha={"left": "left", "right": "right"}.get(note.xanchor, "center"),
+			va={"top": "top", "middle": "center"}.get(note.yanchor, "bottom"))
+	if layout.title.text:
+		out.text(layout.title.x if layout.title.x is not None else 0.05, 1 - top / 2 / height,
+			layout.title.text, fontsize=17 * PX, color="#2a3f5f", va="center")
+	return out
+
+
+def _draw_sunburst(ax, trace, center, size):
+	"""
+	Labels a Sunburst trace with branchvalues "total" of radius SIZE
+	around CENTER on AX, and returns its wedges
+	"""
+	from matplotlib.colors import to_rgb
+	from matplotlib.patches import Wedge
+	wedges = []
+	labels = [str(label) for label in trace.labels]
+	ids = [str(i) for i in trace.ids] if trace.ids is not None else labels
+	parents = [str(parent) for parent in trace.parents]
+	values = np.asarray(trace.values, dtype=float)
+	children = {}
+	for n, parent in enumerate(parents):
+		children.setdefault(parent if parent in ids else "", []).append(n)
+	depth = lambda n: 1 + max((depth(c) for c in children.get(ids[n], [])), default=0)
+	ring = size / max(depth(n) for n in children[""])
+
+	def draw(nodes, start, span, total, level, color):
+		if trace.sort is not False:
+			nodes = sorted(nodes, key=lambda n: -values[n])
+		for n in nodes:
+			if not values[n] > 0 or not total > 0:
+				continue
+			# roots take the colorway in data order, children a lighter
+			# shade of their parent
+			fill = color if color is not None else COLORWAY[roots.index(n) % len(COLORWAY)]
+			sweep = span * values[n] / total
+			wedges.append(Wedge(center, ring * (level + 1), start, start + sweep, width=ring,
+				facecolor=fill, edgecolor="white", linewidth=1))
+			middle = np.radians(start + sweep / 2)
+			radius = ring * (level + 0.5) if level else ring * 0.5 * (sweep < 360)
+			if np.radians(sweep) * max(radius, ring / 2) > 0.15 * size:
+				ax.text(center[0] + radius * np.cos(middle), center[1] + radius * np.sin(middle), labels[n],
+					ha="center", va="center", fontsize=12 * PX,
+					color="white" if np.dot(to_rgb(fill), [0.299, 0.587, 0.114]) < 0.5 else "#444")
+			draw(children.get(ids[n], []), start, sweep, values[n], level + 1,
+				0.35 + 0.65 * np.array(to_rgb(fill)))
+			start += sweep
+
+	roots = children[""]
+	draw(roots, 0, 360, values[roots].sum(), 0, None)
+	return wedges
+
+
+def _draw_choropleth(out, trace, rect, mapbox, width, height):
+	"""draws a Choroplethmapbox trace into RECT, without a basemap"""
+	from matplotlib.collections import PolyCollection
+	from matplotlib.colors import LinearSegmentedColormap, Normalize
+	from plotly.colors import unlabel_rgb
+	ax = out.add_axes(rect)
+	ax.set_facecolor("#e5ecf6")
+	ax.set_xticks([])
+	ax.set_yticks([])
+	geojson = trace.geojson
+	if isinstance(geojson, str):
+		with open(geojson) as f:
+			geojson = json.load(f)
+	key = (trace.featureidkey or "id").split(".")
+	features = {}
+	for feature in geojson["features"]:
+		value = feature
+		for part in key:
+			value = value[part]
+		features[str(value)] = feature["geometry"]
+	verts, z = [], []
+	for location, value in zip(trace.locations, trace.z):
+		geometry = features.get(str(location))
+		if geometry is None:
+			continue
+		polygons = geometry["coordinates"]
+		if geometry["type"] == "Polygon":
+			polygons = [polygons]
+		for polygon in polygons:
+			verts.append(np.asarray(polygon[0], dtype=float))
+			z.append(value)
+	z = np.asarray(z, dtype=float)
+	scale = trace.colorscale or ((0, "#440154"), (1, "#fde725"))
+	cmap = LinearSegmentedColormap.from_list("colorscale",
+		[(stop, color if color.startswith("#") else np.array(unlabel_rgb(color)) / 255)
+		for stop, color in scale])
+	finite = z[np.isfinite(z)]
+	zmin = trace.zmin if trace.zmin is not None else (finite.min() if len(finite) else 0)
+	zmax = trace.zmax if trace.zmax is not None else (finite.max() if len(finite) else 1)
+	cells = PolyCollection(verts, array=np.ma.masked_invalid(z), cmap=cmap,
+		norm=Normalize(zmin, zmax), edgecolor="none", alpha=trace.marker.opacity)
+	cells.cmap.set_bad(alpha=0)
+	ax.add_collection(cells)
+	# the view of a mapbox map of this center, zoom and size
+	if mapbox.center.lon is not None and mapbox.center.lat is not None:
+		lon, lat, zoom = mapbox.center.lon, mapbox.center.lat, mapbox.zoom or 1
+		lon_span = rect[2] * width / (512 * 2**zoom) * 360
+		lat_span = lon_span * rect[3] * height / (rect[2] * width) * np.cos(np.radians(lat))
+		ax.set_xlim(lon - lon_span / 2, lon + lon_span / 2)
+		ax.set_ylim(lat - lat_span / 2, lat + lat_span / 2)
+	else:
+		ax.autoscale_view()
+	cax = out.add_axes([rect[0] + rect[2] + 10 / width, rect[1], 20 / width, rect[3]])
+	out.colorbar(cells, cax=cax)
@@ -0,0 +1,349 @@
+import numpy as np
+import netCDF4 as nc
+import operator
+import os
+import re
+import glob
+from collections import OrderedDict
+from .instrument import stage, count
+
+class DatasetPool:
+	"""
+	Opens NetCDF files on demand and keeps at most MAX_OPEN of them open,
+	closing the least recently used one first
+	"""
+
+	def __init__(self, max_open=16):
+		assert max_open > 0, "max_open must be positive"
+		self.max_open = max_open
+		self._open = OrderedDict()
+
+	def open(self, path):
+		if path in self._open:
+			self._open.move_to_end(path)
+			return self._open[path]
+		while len(self._open) >= self.max_open:
+			self._open.popitem(last=False)[1].close()
+		f = _dataset(path)
+		self._open[path] = f
+		return f
+
+	def __getstate__(self):
+		# open datasets cannot be pickled, worker processes reopen lazily
+		state = self.__dict__.copy()
+		state['_open'] = OrderedDict()
+		return state
+
+	def close(self):
+		"""close every open file"""
+		while self._open:
+			self._open.popitem()[1].close()
+
+
+class PooledDataset:
+	"""
+	Stands in for the dataset at PATH of POOL. Every attribute, such as
+	variables or dimensions, is looked up on pool.open(PATH), so the file is
+	reopened if the pool closed it meanwhile, and reads never go through a
+	handle the pool has closed (netCDF reuses the ids of closed files, so a
+	stale handle would silently read another file). Variables taken from it
+	are only valid until the pool opens another file
+	"""
+
+	def __init__(self, pool, path):
+		self.pool = pool
+		self.path = path
+
+	def __getattr__(self, name):
+		# pool and path are looked up here before __init__ ran when unpickled
+		if name in ('pool', 'path') or name.startswith('__'):
+			raise AttributeError(name)
+		return getattr(self.pool.open(self.path), name)
+
+	def __repr__(self):
+		return f"PooledDataset({self.path!r})"
+
+
+class RestartCatalog:
+	"""
+	Lazy catalog of the restart files of a run. Files are indexed by the
+	YYYY date parsed from their names but are only opened on first access,
+	and at most MAX_OPEN datasets are kept open at once, least recently used
+	ones are closed first. Like before, restart[year] looks files up by run
+	year, starting with year 1 for the earliest file. Every file gets its
+	own run year, also when several files share a date. restart[year]
+	returns a PooledDataset, which reopens its file on access if needed.
+	"""
+
+	def __init__(self, rest_folder, max_open=16):
+		self.pool = DatasetPool(max_open)
+		self.paths = []
+		self.file_dates = []
+		for name in sorted(os.listdir(rest_folder)):
+			found = re.findall(r'\.(\d{4})-', name)
+			if found:
+				self.paths.append(f"{rest_folder}/{name}")
+				self.file_dates.append(int(found[0]))
+		# the first file of every date
+		self.dates = {}
+		for date, path in zip(self.file_dates, self.paths):
+			self.dates.setdefault(date, path)
+
+	def __len__(self):
+		return len(self.paths)
+
+	def __iter__(self):
+		return iter(range(1, len(self.paths) + 1))
+
+	def __contains__(self, year):
+		try:
+			year = operator.index(year)
+		except TypeError:
+			return False
+		return 1 <= year <= len(self.paths)
+
+	def __getitem__(self, year):
+		if year not in self:
+			raise KeyError(year)
+		return PooledDataset(self.pool, self.paths[operator.index(year) - 1])
+
+	def keys(self):
+		return list(self)
+
+	def items(self):
+		return [(year, self[year]) for year in self]
+
+	def path(self, year):
+		"""file path of run year YEAR, without opening it"""
+		return self.paths[operator.index(year) - 1]
+
+	def date(self, year):
+		"""the YYYY date of run year YEAR"""
+		return self.file_dates[operator.index(year) - 1]
+
+	def by_date(self, date):
+		"""the (first) restart file dated DATE"""
+		return PooledDataset(self.pool, self.dates[date])
+
+	def open(self, path):
+		return self.pool.open(path)
+
+	def close(self):
+		"""close every open restart file"""
+		self.pool.close()
+
+
+class History:
+	"""
+	Sliced access to history variables, from one history file or from a run
+	split over several files along time (PATHS can be a path, a glob pattern
+	or a list of paths). Reads only the requested hyperslab of time window,
+	gridcells and variables, reading all requested variables of a file while
+	it is open. With MFDATASET, multiple files are read through one
+	nc.MFDataset, which needs NETCDF3 or NETCDF4_CLASSIC files; otherwise
+	they are opened one at a time through a pool of at most MAX_OPEN files
+	"""
+
+	def __init__(self, paths, mfdataset=False, max_open=16):
+		if isinstance(paths, str):
+			paths = sorted(glob.glob(paths)) or [paths]
+		self.paths = list(paths)
+		self.pool = DatasetPool(max_open)
+		self.mfdataset = mfdataset and len(self.paths) > 1
+		self._lengths = None
+		self.dataset = None
+		self._open_dataset()
+
+	def _open_dataset(self):
+		# several files without MFDATASET are opened on demand by the pool
+		if len(self.paths) == 1:
+			self.dataset = _dataset(self.paths[0])
+		elif self.mfdataset:
+			with stage("open", path=self.paths[0]):
+				self.dataset = nc.MFDataset(self.paths, aggdim="time")
+			count("files_opened", len(self.paths))
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['dataset'] = None
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._open_dataset()
+
+	def _first(self):
+		if self.dataset is not None:
+			return self.dataset
+		return self.pool.open(self.paths[0])
+
+	@property
+	def variables(self):
+		"""variables of the first file, for metadata such as dimensions and maps"""
+		return self._first().variables
+
+	@property
+	def dimensions(self):
+		return self._first().dimensions
+
+	def lengths(self):
+		"""number of timesteps in each file"""
+		if self._lengths is None:
+			if self.dataset is not None:
+				self._lengths = [len(self.dataset.dimensions['time'])]
+			else:
+				self._lengths = [len(self.pool.open(path).dimensions['time']) for path in self.paths]
+		return self._lengths
+
+	def shape(self, name):
+		"""shape of variable NAME over the whole run"""
+		return (sum(self.lengths()),) + self.variables[name].shape[1:]
+
+	def _segments(self, time):
+		"""splits global TIME indices into (dataset, local indices, global indices) per file"""
+		indices = np.arange(sum(self.lengths()))[time if time is not None else slice(None)]
+		indices = np.atleast_1d(indices)
+		if self.dataset is not None:
+			return [(self.dataset, indices, indices)]
+		segments = []
+		start = 0
+		for path, length in zip(self.paths, self.lengths()):
+			inside = indices[(indices >= start) & (indices < start + length)]
+			if len(inside):
+				segments.append((path, inside - start, inside))
+			start += length
+		return segments
+
+	def read(self, names, time=None, gridcells=None):
+		"""
+		Returns a dict of NAMES to arrays of the TIME indices (an index,
+		slice or list, default all) and GRIDCELLS (indices along lndgrid,
+		default all) of each variable. The time and lndgrid axes are kept
+		"""
+		parts = {name: [] for name in names}
+		for f, local, _ in self._segments(time):
+			if isinstance(f, str):
+				f = self.pool.open(f)
+			with stage("read"):
+				for name in names:
+					var = f.variables[name]
+					key = tuple(_compact(local) if dim == 'time' else
+						_compact(np.atleast_1d(gridcells)) if dim == 'lndgrid' and gridcells is not None else
+						slice(None) for dim in var.dimensions)
+					parts[name].append(var[key])
+			count("values_read", sum(part[-1].size for part in parts.values()))
+		return {name: np.ma.concatenate(arrays) if len(arrays) > 1 else arrays[0]
+			for name, arrays in parts.items()}
+
+	def iter_chunks(self, names, time=None, gridcells=None, chunk=12):
+		"""
+		Like read, but yields (time indices, arrays) for CHUNK timesteps at a
+		time so only one chunk is in memory
+		"""
+		indices = np.atleast_1d(np.arange(sum(self.lengths()))[time if time is not None else slice(None)])
+		for start in range(0, len(indices), chunk):
+			window = indices[start:start + chunk]
+			yield window, self.read(names, window, gridcells)
+
+	def aggregate(self, names, how="sum", time=None, gridcells=None, weights=None, chunk=12):
+		"""
+		Returns a dict of NAMES to arrays reduced over the selected
+		GRIDCELLS with HOW ("sum" or "mean", optionally weighted by WEIGHTS,
+		one per gridcell), read CHUNK timesteps at a time
+		"""
+		parts = {name: [] for name in names}
+		for _, arrays in self.iter_chunks(names, time, gridcells, chunk):
+			for name, values in arrays.items():
+				axis = self.variables[name].dimensions.index('lndgrid')
+				values = np.ma.filled(values.astype(float), 0)
+				if weights is not None:
+					shape = [1] * values.ndim
+					shape[axis] = -1
+					values = values * np.reshape(weights, shape)
+				reduced = values.sum(axis=axis)
+				if how == "mean":
+					reduced /= np.sum(weights) if weights is not None else values.shape[axis]
+				parts[name].append(reduced)
+		return {name: np.concatenate(arrays) for name, arrays in parts.items()}
+
+	def close(self):
+		"""close every open history file"""
+		self.pool.close()
+		if self.dataset is not None and self.dataset.isopen():
+			self.dataset.close()
+
+
+def _dataset(path):
+	"""opens the NetCDF file PATH, recorded as an open stage and a files_opened count"""
+	with stage("open", path=path):
+		f = nc.Dataset(path)
+	count("files_opened", path=path)
+	return f
+
+
+def _compact(indices):
+	"""a slice in place of a run of consecutive indices, which reads faster"""
+	indices = np.asarray(indices)
+	if len(indices) and np.all(np.diff(indices) == 1):
+		return slice(int(indices[0]), int(indices[-1]) + 1)
+	return indices
+
+
+class Files:
+
+	def __init__(self, rest_folder=None, param_path=None, 
+		hist_path=None, address="relative", max_open=16, mfdataset=False):
+		self.restart = {}
+		self.param = None
+		self.hist = None
+		self.history = None
+		if rest_folder:
+			assert param_path, "no parameter file specified"
+			if address =="relative":
+				current = os.getcwd()
+				rest_folder = f"{current}/{rest_folder}"
+			self.restart = RestartCatalog(rest_folder, max_open)
+		if param_path:
+			self.param = _dataset(param_path)
+		if hist_path:
+			self.history = History(hist_path, mfdataset, max_open)
+			self.hist = self.history.dataset
+
+	def __getstate__(self):
+		# pickled by path so Files can be sent to worker processes
+		state = self.__dict__.copy()
+		if state['param'] is not None:
+			state['param'] = state['param'].filepath()
+		state['hist'] = None
+		return state
+
+	def __setstate__(self, state):
+		if state['param'] is not None:
+			state['param'] = _dataset(state['param'])
+		self.__dict__.update(state)
+		if self.history is not None:
+			self.hist = self.history.dataset
+
+	def close(self):
+		"""close all files opened by this instance"""
+		if isinstance(self.restart, RestartCatalog):
+			self.restart.close()
+		if self.history is not None:
+			self.history.close()
+		if self.param is not None and self.param.isopen():
+			self.param.close()
+
+	def readin(self, rest_folder_path, param_path, hist_path):
+		"""Read in restart and parameter files"""
+		file_paths = [rest_folder_path + name for name in os.listdir(rest_folder_path) if name != '.DS_Store']
+		file_paths.sort()
+		self.rest = {}
+		print('Reading Files...')
+		if self.kind == "restart":
+			for path in file_paths:
+				year = re.findall(r'\.(\d{4})-', path)[0]
+				f = nc.Dataset(path)
+				self.rest[int(year)] = f
+		self.param = nc.Dataset(param_path)
+		if hist_path:
+			self.hist = nc.Dataset(hist_path)  
\ No newline at end of file
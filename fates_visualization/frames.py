@@ -0,0 +1,73 @@
+import os
+from collections import deque
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from .instrument import stage, sinks, install
+
+
+def figure_to_rgb(fig):
+	"""rasterizes a matplotlib figure straight to an RGB array"""
+	with stage("render"):
+		fig.canvas.draw()
+	return np.asarray(fig.canvas.buffer_rgba())[..., :3].copy()
+
+
+def ordered_map(pool, fn, items, window):
+	"""
+	Like pool.map, but keeps at most WINDOW tasks in flight so finished
+	frames waiting to be written do not pile up in memory
+	"""
+	pending = deque()
+	for item in items:
+		if len(pending) >= window:
+			yield pending.popleft().result()
+		pending.append(pool.submit(fn, item))
+	while pending:
+		yield pending.popleft().result()
+
+
+def spawn_pool(workers, initializer=install, initargs=()):
+	"""
+	A ProcessPoolExecutor of WORKERS processes, each set up by calling
+	INITIALIZER with INITARGS and the instrument sinks of this process
+	"""
+	# spawn rather than fork: HDF5 state does not survive a fork
+	return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+		initializer=initializer, initargs=(*initargs, sinks()))
+
+
+class FrameWriter:
+	"""
+	Streams RGB frames into an animation as they are produced. The output
+	format follows the extension of PATH: ".gif", or ".mp4" (requires
+	imageio-ffmpeg). If FRAME_DIR is passed in, every frame is also saved
+	there as NAME.png
+	"""
+
+	def __init__(self, path, fps=5, frame_dir=None):
+		self.path = path
+		self.fps = fps
+		self.frame_dir = frame_dir
+		self.writer = None
+
+	def __enter__(self):
+		# imported on use, importing the package does not load the encoders
+		import imageio
+		if self.frame_dir:
+			os.makedirs(self.frame_dir, exist_ok=True)
+		if self.path.endswith(".gif"):
+			self.writer = imageio.get_writer(self.path, mode="I", fps=self.fps)
+		else:
+			self.writer = imageio.get_writer(self.path, fps=self.fps)
+		return self
+
+	def append(self, frame, name):
+		with stage("encode"):
+			self.writer.append_data(frame)
+			if self.frame_dir:
+				import imageio
+				imageio.imwrite(f"{self.frame_dir}/{name}.png", frame)
+
+	def __exit__(self, *exc):
+		self.writer.close()
@@ -0,0 +1,294 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from inspect import signature
+
+# the stages the visualization entry points record
+STAGES = ("open", "read", "allometry", "preprocess", "layout", "render", "encode")
+
+
+class Totals:
+	"""
+	Sink that accumulates the calls, total, min and max seconds of every
+	stage and the value of every counter. The module keeps one of these
+	for the whole process, see totals()
+	"""
+
+	def __init__(self):
+		self.stages = {}
+		self.counters = {}
+
+	def __call__(self, event):
+		if event['event'] == "count":
+			self.counters[event['name']] = self.counters.get(event['name'], 0) + event['value']
+			return
+		seconds = event['seconds']
+		total = self.stages.setdefault(event['name'],
+			{'calls': 0, 'seconds': 0., 'min': seconds, 'max': seconds})
+		total['calls'] += 1
+		total['seconds'] += seconds
+		total['min'] = min(total['min'], seconds)
+		total['max'] = max(total['max'], seconds)
+
+	def report(self):
+		"""the totals as a table, slowest stage first"""
+		lines = [f"{'stage':<18}{'calls':>8}{'total s':>12}{'mean s':>12}{'max s':>12}"]
+		for name, total in sorted(self.stages.items(), key=lambda item: -item[1]['seconds']):
+			lines.append(f"{name:<18}{total['calls']:>8}{total['seconds']:>12.4f}"
+				f"{total['seconds'] / total['calls']:>12.4f}{total['max']:>12.4f}")
+		lines += [f"{name:<18}{value:>8}" for name, value in sorted(self.counters.items())]
+		return "\n".join(lines)
+
+
+class LoggerSink:
+	"""sends every event to LOGGER (default: the "fates" logger) at LEVEL"""
+
+	def __init__(self, logger=None, level=logging.INFO):
+		self.logger = logger or logging.getLogger("fates")
+		self.level = level
+
+	def __call__(self, event):
+		tags = " ".join(f"{key}={value}" for key, value in event.items()
+			if key not in ("event", "name", "seconds", "value", "time", "pid"))
+		if event['event'] == "count":
+			self.logger.log(self.level, "%s +%s %s", event['name'], event['value'], tags)
+		else:
+			self.logger.log(self.level, "%s %.4f s %s", event['name'], event['seconds'], tags)
+
+
+class JsonlSink:
+	"""
+	appends every event to the file PATH as one line of JSON. Worker
+	processes append to the same file
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.file = None
+
+	def __call__(self, event):
+		if self.file is None:
+			self.file = open(self.path, "a", buffering=1)
+		self.file.write(json.dumps(event, default=str) + "\n")
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['file'] = None
+		return state
+
+	def close(self):
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+
+
+class CallbackSink:
+	"""
+	calls CALLBACK(event) for every event. To receive the events of worker
+	processes, CALLBACK must be picklable
+	"""
+
+	def __init__(self, callback):
+		self.callback = callback
+
+	def __call__(self, event):
+		self.callback(event)
+
+
+_totals = Totals()
+_sinks = []
+# names and tags of the stages in progress, innermost last
+_active = []
+
+
+def add_sink(sink):
+	"""sends every event from now on to SINK, a callable taking an event dict"""
+	_sinks.append(sink)
+	return sink
+
+def remove_sink(sink):
+	if sink in _sinks:
+		_sinks.remove(sink)
+	if hasattr(sink, "close"):
+		sink.close()
+
+def sinks():
+	"""the sinks in use, to pass to install() in worker processes"""
+	return list(_sinks)
+
+def install(sinks):
+	"""replaces the sinks of this process, used by worker initializers"""
+	_sinks[:] = sinks
+
+@contextmanager
+def recording(*sinks):
+	"""sends the events inside the block to SINKS as well"""
+	for sink in sinks:
+		add_sink(sink)
+	try:
+		yield sinks
+	finally:
+		for sink in sinks:
+			remove_sink(sink)
+
+def totals():
+	"""the Totals of every event of this process since the last reset()"""
+	return _totals
+
+def reset():
+	global _totals
+	_totals = Totals()
+
+
+def _emit(event):
+	_totals(event)
+	for sink in _sinks:
+		sink(event)
+
+def _tags():
+	tags = {}
+	for _, stage_tags in _active:
+		tags.update(stage_tags)
+	return tags
+
+
+@contextmanager
+def stage(name, **tags):
+	"""
+	Times the block as stage NAME. TAGS (such as year or site) are recorded
+	with it and with every stage and counter nested inside it. A stage
+	nested in a stage of the same name is not recorded again, so calls that
+	time themselves can be timed by their callers too
+	"""
+	nested = any(name == active for active, _ in _active)
+	_active.append((name, tags))
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		seconds = time.perf_counter() - start
+		event_tags = _tags()
+		_active.pop()
+		if not nested:
+			_emit(dict(event_tags, event="stage", name=name, seconds=seconds,
+				time=time.time(), pid=os.getpid()))
+
+@contextmanager
+def tagged(**tags):
+	"""records TAGS with every stage and counter inside the block"""
+	_active.append((None, tags))
+	try:
+		yield
+	finally:
+		_active.pop()
+
+def count(name, value=1, **tags):
+	"""adds VALUE to the counter NAME"""
+	_emit(dict(_tags(), **tags, event="count", name=name, value=value,
+		time=time.time(), pid=os.getpid()))
+
+def timed(name=None, *arguments):
+	"""
+	Decorator recording every call as a stage, named NAME or after the
+	function, tagged with the values of the ARGUMENTS passed in
+	"""
+	def decorate(fn):
+		parameters = signature(fn)
+		@wraps(fn)
+		def wrapper(*args, **kwargs):
+			tags = {}
+			if arguments:
+				bound = parameters.bind(*args, **kwargs)
+				bound.apply_defaults()
+				tags = {argument: bound.arguments[argument] for argument in arguments}
+			with stage(name or fn.__name__, **tags):
+				return fn(*args, **kwargs)
+		return wrapper
+	return decorate
+
+
+class Capture:
+	"""
+	The result of capture(): RESULT, what the call returned, HOTSPOTS, the
+	slowest functions, ALLOCATIONS, the lines whose allocations grew the
+	most over the call (memory still held at its end), PEAK_MB, the traced
+	peak during the call,
+	and STAGES, the Totals of the stages recorded during the call
+	"""
+
+	def __init__(self, result, seconds, hotspots, allocations, peak_mb, stages):
+		self.result = result
+		self.seconds = seconds
+		self.hotspots = hotspots
+		self.allocations = allocations
+		self.peak_mb = peak_mb
+		self.stages = stages
+
+	def report(self):
+		"""the hotspots, allocations and stages as ranked tables"""
+		lines = [f"{self.seconds:.3f} s"]
+		if self.hotspots:
+			lines += ["", f"{'calls':>10}{'own s':>10}{'total s':>10}  function"]
+			lines += [f"{row['calls']:>10}{row['own_seconds']:>10.4f}{row['seconds']:>10.4f}  "
+				f"{row['function']}" for row in self.hotspots]
+		if self.allocations is not None:
+			lines += ["", f"peak {self.peak_mb:.1f} MB", f"{'MB':>10}{'blocks':>10}  line"]
+			lines += [f"{row['mb']:>10.2f}{row['blocks']:>10}  {row['line']}"
+				for row in self.allocations]
+		if self.stages.stages:
+			lines += ["", self.stages.report()]
+		return "\n".join(lines)
+
+	def __str__(self):
+		return self.report()
+
+
+def capture(fn, *args, profile=True, memory=False, top=20, sort="cumulative", **kwargs):
+	"""
+	Calls FN(*ARGS, **KWARGS) once under cProfile (PROFILE) and tracemalloc
+	(MEMORY) and returns a Capture ranking the TOP functions by SORT
+	("cumulative" or "tottime") and the TOP allocating lines. Work done in
+	worker processes is not profiled
+	"""
+	stages = Totals()
+	profiler = cProfile.Profile() if profile else None
+	tracing = memory and not tracemalloc.is_tracing()
+	if tracing:
+		tracemalloc.start()
+	if memory:
+		tracemalloc.reset_peak()
+		before = tracemalloc.take_snapshot()
+	start = time.perf_counter()
+	with recording(stages):
+		if profiler:
+			profiler.enable()
+		try:
+			result = fn(*args, **kwargs)
+		finally:
+			if profiler:
+				profiler.disable()
+	seconds = time.perf_counter() - start
+	hotspots, allocations, peak_mb = [], None, None
+	if memory:
+		peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+		# leave out what the profiler itself allocated
+		ignore = [tracemalloc.Filter(False, module.__file__) for module in (cProfile, tracemalloc)]
+		after = tracemalloc.take_snapshot().filter_traces(ignore)
+		statistics = after.compare_to(before.filter_traces(ignore), "lineno")[:top]
+		allocations = [{'line': str(stat.traceback[0]), 'mb': stat.size_diff / 2**20,
+			'blocks': stat.count_diff} for stat in statistics]
+		if tracing:
+			tracemalloc.stop()
+	if profiler:
+		rows = pstats.Stats(profiler).stats.items()
+		key = {"cumulative": 3, "tottime": 2}[sort]
+		for (path, line, function), timing in sorted(rows, key=lambda row: -row[1][key])[:top]:
+			hotspots.append({'function': f"{os.path.basename(path)}:{line}({function})",
+				'calls': timing[1], 'own_seconds': timing[2], 'seconds': timing[3]})
+	return Capture(result, seconds, hotspots, allocations, peak_mb, stages)
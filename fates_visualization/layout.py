@@ -0,0 +1,101 @@
+from collections import OrderedDict
+import numpy as np
+
+
+def squarify_strips(sizes, dx, dy):
+	"""
+	Splits SIZES, normalized so they add up to DX * DY, into the strips of
+	a squarified treemap, making the same choices as squarify.squarify.
+	Returns a list of (number of sizes, vertical) strips in layout order,
+	where a vertical strip is laid along the left of the remaining space
+	"""
+	sizes = np.asarray(sizes, dtype=float)
+	strips = []
+	start = 0
+	while start < len(sizes):
+		vertical = dx >= dy
+		side = dy if vertical else dx
+		rest = sizes[start:]
+		# worst aspect ratio of a strip of the first i sizes, for every i
+		thickness = np.cumsum(rest) / side
+		worst = np.maximum(thickness**2 / np.minimum.accumulate(rest),
+			np.maximum.accumulate(rest) / thickness**2)
+		grows = np.flatnonzero(worst[:-1] < worst[1:])
+		count = grows[0] + 1 if len(grows) else len(rest)
+		strips.append((int(count), bool(vertical)))
+		covered = rest[:count].sum() / side
+		if vertical:
+			dx -= covered
+		else:
+			dy -= covered
+		start += count
+	return strips
+
+
+def strip_rects(sizes, strips, x, y, dx, dy):
+	"""
+	Lays SIZES, normalized to DX * DY, out in STRIPS as returned by
+	squarify_strips. Returns an (n, 4) array of x, y, width, height
+	"""
+	sizes = np.asarray(sizes, dtype=float)
+	rects = np.empty((len(sizes), 4))
+	start = 0
+	for count, vertical in strips:
+		part = sizes[start:start + count]
+		side = dy if vertical else dx
+		covered = part.sum() / side
+		lengths = part / covered
+		offsets = np.concatenate(([0.], np.cumsum(lengths)[:-1]))
+		if vertical:
+			rects[start:start + count] = np.column_stack([np.full(count, x), y + offsets,
+				np.full(count, covered), lengths])
+			x, dx = x + covered, dx - covered
+		else:
+			rects[start:start + count] = np.column_stack([x + offsets, np.full(count, y),
+				lengths, np.full(count, covered)])
+			y, dy = y + covered, dy - covered
+		start += count
+	return rects
+
+
+class TreemapLayout:
+	"""
+	Squarified treemap layouts of the rectangle X, Y, DX, DY. The strips of
+	every fresh layout are cached per area vector. While the areas passed in
+	stay within TOLERANCE of the areas the current strips were made for
+	(the fraction of the total area that changed hands), the strips are
+	kept and only resized, so rectangles move smoothly between frames
+	instead of jumping to a new arrangement
+	"""
+
+	def __init__(self, x=0., y=0., dx=1., dy=1., tolerance=0.1, max_cached=256):
+		self.rect = (x, y, dx, dy)
+		self.tolerance = tolerance
+		self.max_cached = max_cached
+		self.cached = OrderedDict()
+		self.anchor = None
+		self.strips = None
+
+	def reset(self):
+		"""forgets the current strips, the next layout is squarified afresh"""
+		self.anchor = None
+		self.strips = None
+
+	def __call__(self, areas):
+		"""the (n, 4) array of x, y, width, height of every area in AREAS"""
+		x, y, dx, dy = self.rect
+		areas = np.asarray(areas, dtype=float)
+		if not len(areas):
+			return np.empty((0, 4))
+		fractions = areas / areas.sum()
+		if self.anchor is None or len(self.anchor) != len(fractions) or \
+			np.abs(fractions - self.anchor).sum() / 2 > self.tolerance:
+			key = tuple(areas)
+			if key in self.cached:
+				self.cached.move_to_end(key)
+			else:
+				self.cached[key] = squarify_strips(fractions * dx * dy, dx, dy)
+				if len(self.cached) > self.max_cached:
+					self.cached.popitem(last=False)
+			self.anchor, self.strips = fractions, self.cached[key]
+		return strip_rects(fractions * dx * dy, self.strips, x, y, dx, dy)
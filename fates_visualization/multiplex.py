@@ -0,0 +1,143 @@
+import os
+import re
+from collections import OrderedDict
+from functools import partial
+import numpy as np
+from .frames import spawn_pool
+
+
+def dimension_maps(hist, dim):
+	"""
+	HIST: a history file or files.History
+	DIM: a FATES multiplexed dimension such as "fates_levscpf"
+	Returns an ordered dict-like list of (factor, index map) pairs read from
+	the fates_<factor>map_* variables along DIM, slowest varying factor
+	first, e.g. [("pft", ...), ("sc", ...)] for fates_levscpf. Index maps are
+	zero based. A dimension without usable maps is its own single factor
+	"""
+	maps = []
+	for name, var in hist.variables.items():
+		found = re.match(r'fates_(\w+?)map_', name)
+		if found and var.dimensions == (dim,):
+			index = np.asarray(var[:]).astype(int) - 1
+			if index.min() >= 0:
+				maps.append((found.group(1), index))
+	if not maps:
+		size = len(hist.dimensions[dim])
+		return [(dim[len("fates_lev"):] if dim.startswith("fates_lev") else dim, np.arange(size))]
+	# the fastest varying factor changes most often along the dimension
+	maps.sort(key=lambda pair: np.count_nonzero(np.diff(pair[1])))
+	return maps
+
+
+def unmultiplex(values, maps):
+	"""
+	VALUES: array whose last axis is a multiplexed dimension
+	MAPS: the (factor, index map) pairs returned by dimension_maps
+	Returns VALUES with the last axis split into one axis per factor, e.g.
+	(time, scpf) -> (time, pft, sizeclass). Combinations absent from the
+	dimension are 0
+	"""
+	shape = tuple(index.max() + 1 for _, index in maps)
+	split = np.zeros(values.shape[:-1] + shape, dtype=np.result_type(values, float))
+	split[(Ellipsis,) + tuple(index for _, index in maps)] = values
+	return split
+
+
+def reduce_multiplexed(history, names, keep=("pft",), time=slice(1, None), gridcells=[0],
+		weights=None):
+	"""
+	Reads the history variables NAMES, which must share one multiplexed
+	dimension, splits that dimension into its factors and sums over every
+	factor not in KEEP, all variables at once.
+	HISTORY: a files.History
+	TIME: time index, slice or list, by default every timestep but the first
+	GRIDCELLS: lndgrid indices summed together (or averaged with WEIGHTS),
+		None for all gridcells
+	Returns an array of shape (len(NAMES), time, *kept factors) and the
+	names of the kept factors
+	"""
+	dims = {history.variables[name].dimensions[1] for name in names}
+	assert len(dims) == 1, f"variables are on different dimensions: {dims}"
+	maps = dimension_maps(history, dims.pop())
+	how = "sum" if weights is None else "mean"
+	reduced = history.aggregate(names, how, time, gridcells, weights)
+	values = np.stack([reduced[name] for name in names])
+	split = unmultiplex(values, maps)
+	factors = [factor for factor, _ in maps]
+	drop = tuple(values.ndim - 1 + i for i, factor in enumerate(factors) if factor not in keep)
+	return split.sum(axis=drop), [factor for factor in factors if factor in keep]
+
+
+def combine(reduced, var_dict, pfts):
+	"""
+	Arranges the (time, pft) arrays in REDUCED into the sunburst values of
+	VAR_DICT: the total of every pft, then every variable of every pft
+	"""
+	bottom = np.stack([reduced[name][:, :len(pfts)] for name in var_dict.values()])
+	final_top = bottom.sum(axis=0)
+	final_bottom = bottom.transpose(1, 0, 2).reshape(bottom.shape[1], -1)
+	return np.concatenate((final_top, final_bottom), axis=1)
+
+
+# (time, pft) reductions of the runs and variables computed most recently,
+# least recently used first, at most MAX_REDUCTIONS of them
+MAX_REDUCTIONS = 1024
+_reductions = OrderedDict()
+
+
+def clear_reductions():
+	"""forgets every reduction cached by reduce_runs"""
+	_reductions.clear()
+
+
+def _reduction_key(history, name, year_len, gridcells):
+	mtimes = tuple(os.stat(path).st_mtime_ns for path in history.paths)
+	return (tuple(history.paths), mtimes, name, year_len,
+		None if gridcells is None else tuple(gridcells))
+
+
+def reduce_runs(histories, names, year_len, gridcells=[0], workers=1):
+	"""
+	Returns, for every history in HISTORIES, a dict of each variable in
+	NAMES summed over size classes as a (YEAR_LEN, pft) array. Runs are
+	reduced in WORKERS parallel processes, and the MAX_REDUCTIONS most
+	recently used results are cached per run and variable, so plotting the
+	same runs again with another layout or subset of variables does not
+	reread them
+	"""
+	keys = [{name: _reduction_key(history, name, year_len, gridcells) for name in names}
+		for history in histories]
+	found, jobs = {}, {}
+	for history, history_keys in zip(histories, keys):
+		missing = []
+		for name, key in history_keys.items():
+			if key in _reductions:
+				_reductions.move_to_end(key)
+				found[key] = _reductions[key]
+			else:
+				missing.append(name)
+		if missing:
+			jobs[tuple(history.paths)] = (history, missing)
+	jobs = list(jobs.values())
+	reduce_job = partial(_reduce_run, year_len=year_len, gridcells=gridcells)
+	if workers > 1 and len(jobs) > 1:
+		with spawn_pool(workers) as pool:
+			results = list(pool.map(reduce_job, jobs))
+	else:
+		results = [reduce_job(job) for job in jobs]
+	for (history, missing), values in zip(jobs, results):
+		for name, value in zip(missing, values):
+			key = _reduction_key(history, name, year_len, gridcells)
+			found[key] = _reductions[key] = value
+			while len(_reductions) > MAX_REDUCTIONS:
+				_reductions.popitem(last=False)
+	# FOUND holds every result of this call, even those already evicted
+	return [{name: found[key] for name, key in history_keys.items()} for history_keys in keys]
+
+
+def _reduce_run(job, year_len, gridcells):
+	history, names = job
+	values, _ = reduce_multiplexed(history, names, keep=("pft",),
+		time=slice(1, year_len + 1), gridcells=gridcells)
+	return values
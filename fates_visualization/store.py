@@ -0,0 +1,171 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from .treemap_utils import SMALL_PATCH_AREA, read_cohorts, cohort_tables
+from .frames import ordered_map, spawn_pool
+
+COLUMNS = {'year': 'i4', 'site': 'i4', 'patch': 'i4', 'cohort': 'i4', 'pft': 'i4',
+	'dbh': 'f8', 'height': 'f8', 'nplant': 'f8', 'crown_area': 'f8',
+	'canopy_layer': 'i4', 'area': 'f8', 'age': 'f8'}
+
+
+class CohortStore:
+	"""
+	Columnar store of the cohorts of every restart year of a run, written
+	once by CohortStore.build and memory-mapped on open. Every row is one
+	cohort slot of a site: year is the run year as in files.restart[year],
+	patch the patch index within the site and cohort the slot index within
+	the site. area and age are those of the cohort's patch. Empty slots are
+	dropped, except the first slot of an empty patch (pft 0). Rows are
+	ordered by year, site and cohort.
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		with open(os.path.join(path, "meta.json")) as f:
+			self.meta = json.load(f)
+		self.years = self.meta['years']
+		self.offsets = np.array(self.meta['offsets'])
+		self._columns = {}
+
+	@classmethod
+	def build(cls, files, path, years=None, workers=1):
+		"""
+		Reads the restart files of YEARS (default: every year) of FILES,
+		in WORKERS parallel processes, and writes them as a store in the
+		folder PATH. Years are appended as they are read, so memory use
+		does not grow with the number of years
+		"""
+		years = list(files.restart) if years is None else list(years)
+		os.makedirs(path, exist_ok=True)
+		outputs = {name: open(os.path.join(path, f"{name}.bin"), "wb") for name in COLUMNS}
+		offsets = [0]
+		try:
+			if workers > 1:
+				with spawn_pool(workers) as pool:
+					rows = ordered_map(pool, _extract_year, [(files, year) for year in years], 2 * workers)
+					offsets += _append(outputs, rows)
+			else:
+				offsets += _append(outputs, (_extract_year((files, year)) for year in years))
+		finally:
+			for output in outputs.values():
+				output.close()
+		rest_fin = files.restart[years[0]]
+		meta = {'years': years,
+			'dates': [files.restart.date(year) for year in years],
+			'offsets': np.cumsum(offsets).tolist(),
+			'per_site': len(rest_fin.dimensions['cohort']) // len(rest_fin.dimensions['column']),
+			'columns': COLUMNS}
+		with open(os.path.join(path, "meta.json"), "w") as f:
+			json.dump(meta, f)
+		return cls(path)
+
+	def __getstate__(self):
+		# memory maps would be pickled as copies, worker processes remap lazily
+		state = self.__dict__.copy()
+		state['_columns'] = {}
+		return state
+
+	def __len__(self):
+		return int(self.offsets[-1])
+
+	def column(self, name):
+		"""the memory-mapped array of column NAME over every row"""
+		if name not in self._columns:
+			self._columns[name] = np.memmap(os.path.join(self.path, f"{name}.bin"),
+				dtype=COLUMNS[name], mode="r", shape=(len(self),))
+		return self._columns[name]
+
+	def rows(self, first=None, last=None):
+		"""the slice of rows of years FIRST to LAST, inclusive"""
+		first = self.years[0] if first is None else first
+		last = self.years[-1] if last is None else last
+		start = np.searchsorted(self.years, first, side="left")
+		stop = np.searchsorted(self.years, last, side="right")
+		return slice(int(self.offsets[start]), int(self.offsets[stop]))
+
+	def query(self, years=None, pfts=None, sites=None, columns=None):
+		"""
+		Returns a DataFrame of the rows in YEARS, either a year or an
+		inclusive (first, last) range, with pft in PFTS and site in SITES.
+		Pass None for no filter. COLUMNS: columns to return, default all
+		"""
+		if years is None:
+			years = (None, None)
+		elif np.isscalar(years):
+			years = (years, years)
+		rows = self.rows(*years)
+		keep = np.ones(rows.stop - rows.start, dtype=bool)
+		if pfts is not None:
+			keep &= np.isin(self.column('pft')[rows], pfts)
+		if sites is not None:
+			keep &= np.isin(self.column('site')[rows], sites)
+		columns = list(COLUMNS) if columns is None else columns
+		if keep.all():
+			return pd.DataFrame({name: np.array(self.column(name)[rows]) for name in columns})
+		return pd.DataFrame({name: self.column(name)[rows][keep] for name in columns})
+
+	def sites(self, year):
+		"""the sites with patches in YEAR"""
+		return np.unique(self.column('site')[self.rows(year, year)]).tolist()
+
+	def cohorts(self, year, site=None):
+		"""
+		Rebuilds the cohort vectors read_cohorts returns for YEAR, of one
+		SITE or of every site
+		"""
+		rows = self.rows(year, year)
+		if site is not None:
+			sites = self.column('site')[rows]
+			start = rows.start + np.searchsorted(sites, site, side="left")
+			stop = rows.start + np.searchsorted(sites, site, side="right")
+			rows = slice(int(start), int(stop))
+		get = lambda name: np.array(self.column(name)[rows])
+		site_, patch = get('site'), get('patch')
+		# patch area and age are only stored on the first slot of each patch
+		first = np.ones(len(patch), dtype=bool)
+		first[1:] = (patch[1:] != patch[:-1]) | (site_[1:] != site_[:-1])
+		cohorts = {name: get(name) for name in
+			['pft', 'dbh', 'height', 'nplant', 'canopy_layer', 'crown_area']}
+		cohorts['area'] = np.where(first, get('area'), 0)
+		cohorts['age'] = np.where(first, get('age'), 0)
+		cohorts['slot'] = site_.astype(int) * self.meta['per_site'] + get('cohort')
+		return cohorts
+
+	def tables(self, year, mode="basic", site=None, threshold=SMALL_PATCH_AREA):
+		"""the (df1, df2) tables pre_process returns, read from the store"""
+		return cohort_tables(self.cohorts(year, site), year, mode, threshold)
+
+
+def _extract_year(task):
+	"""the store rows of one restart year, as a dict of column arrays"""
+	files, year = task
+	cohorts = read_cohorts(files.restart[year], files.param)
+	per_site = len(files.restart[year].dimensions['cohort']) // len(files.restart[year].dimensions['column'])
+	pft = np.ma.filled(cohorts['pft'], 0)
+	area = np.ma.filled(cohorts['area'], 0)
+	slot = cohorts['slot']
+	site, cohort = slot // per_site, slot % per_site
+	# patch index within each site, -1 on slots before a site's first patch
+	patch = np.cumsum(area != 0)
+	patch = patch - np.concatenate(([0], patch))[site * per_site] - 1
+	first = np.maximum.accumulate(np.where(area != 0, np.arange(len(area)), 0))
+	keep = ((pft > 0) | (area != 0)) & (patch >= 0)
+	rows = {'year': np.full(keep.sum(), year), 'site': site[keep], 'patch': patch[keep],
+		'cohort': cohort[keep], 'area': area[first][keep],
+		'age': np.ma.filled(cohorts['age'], 0)[first][keep],
+		'crown_area': np.ma.filled(cohorts['crown_area'], 0)[keep]}
+	for name in ['pft', 'dbh', 'height', 'nplant', 'canopy_layer']:
+		rows[name] = np.ma.filled(cohorts[name], 0)[keep]
+	return rows
+
+
+def _append(outputs, years):
+	"""appends the rows of every year to the column files, returns the row counts"""
+	counts = []
+	for rows in years:
+		for name, output in outputs.items():
+			output.write(np.ascontiguousarray(rows[name], dtype=COLUMNS[name]).tobytes())
+		counts.append(len(rows['year']))
+	return counts
@@ -0,0 +1,179 @@
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+import copy
+from .frames import FrameWriter
+from .multiplex import reduce_runs, combine
+from .export import ExportService
+from .instrument import stage, timed
+from functools import partial
+
+
+@timed("sunburst_matrix", "mode", "workers")
+def sunburst_matrix(files, var_dict, pfts, file_name, mode="gif", path="",
+                    save_individuals=False, folder_name="individuals", workers=1, fps=5,
+                    gridcells=[0], frame_duration=500, exporter=None):
+    shape = (len(files), len(files[0]))
+    one_val = list(var_dict.values())[0]
+    num_years = files[0][0][1].history.shape(one_val)[0] - 1
+    with stage("preprocess"):
+        processed = scpf_param(files, var_dict, pfts, range(1, num_years + 1), gridcells, workers)
+
+    extra = "/"
+    if not path:
+        extra = ""
+    if mode in ("gif", "mp4"):
+        frame_dir = path + extra + folder_name if save_individuals else None
+        service = exporter or ExportService("kaleido", workers)
+        try:
+            with FrameWriter(f"{path}{extra}{file_name}.{mode}", fps, frame_dir) as writer:
+                frames = service.map(partial(_gif_figure, processed, shape), range(num_years))
+                for year, image in enumerate(frames):
+                    writer.append(image, year)
+        finally:
+            if exporter is None:
+                service.close()
+        return
+    with stage("render"):
+        if mode == "slider":
+            fig = _slider_matrix(processed, shape, num_years, frame_duration)
+        else:
+            fig = _interactive_matrix(processed, shape, num_years)
+    with stage("encode"):
+        fig.write_html(f"{path}{extra}{file_name}.html")
+    return fig
+
+
+def _interactive_matrix(processed, shape, num_years):
+    """
+    Builds the sunburst matrix as one trace per cell and year, with a
+    slider showing the traces of one year at a time
+    """
+    fig = make_subplots(rows=shape[0], cols=shape[1],
+                        specs=processed["specs"],
+                        subplot_titles=processed["titles"],
+                        vertical_spacing=0.1)
+    counter = 0
+    for year in range(num_years):
+        for i in range(shape[0]):
+            for j in range(shape[1]):
+                target = processed["cleaned"][i][j]
+                data = target[1][year]
+                fig.add_trace(go.Sunburst(ids=np.arange(len(data)),
+                                          labels=processed["labels"], parents=processed["parents"],
+                                          values=data, branchvalues="total", name=str(year)),
+                              row=i + 1, col=j + 1)
+                if year != 0:
+                    fig.data[counter].visible = False
+                    counter += 1
+
+    steps = []
+    step_size = shape[0] * shape[1]
+    for i in range(0, len(fig.data), step_size):
+        step = dict(
+            method="update",
+            args=[{"visible": [False] * len(fig.data)}],
+            label=str(round(i/step_size + 1)))
+        for j in range(step_size):
+            step["args"][0]["visible"][i + j] = True
+        steps.append(step)
+    sliders = [dict(
+        currentvalue={"prefix": "Year: "},
+        pad={"t": 50},
+        steps=steps)]
+    fig.update_layout(sliders=sliders)
+    return fig
+
+
+def _slider_matrix(processed, shape, num_years, frame_duration):
+    """
+    Builds the sunburst matrix as one trace per cell holding the tree of
+    the first year, and one animation frame per year carrying only the
+    values of every cell
+    """
+    fig = make_subplots(rows=shape[0], cols=shape[1],
+                        specs=processed["specs"],
+                        subplot_titles=processed["titles"],
+                        vertical_spacing=0.1)
+    cells = [cell[1] for row in processed["cleaned"] for cell in row]
+    for k, values in enumerate(cells):
+        fig.add_trace(go.Sunburst(ids=np.arange(values.shape[1]),
+                                  labels=processed["labels"], parents=processed["parents"],
+                                  values=values[0], branchvalues="total", sort=False),
+                      row=k // shape[1] + 1, col=k % shape[1] + 1)
+    fig.frames = [go.Frame(data=[go.Sunburst(values=values[year]) for values in cells],
+                           traces=list(range(len(cells))), name=str(year + 1))
+                  for year in range(num_years)]
+    play = dict(frame=dict(duration=frame_duration, redraw=True), fromcurrent=True,
+                transition=dict(duration=0), mode="immediate")
+    fig.update_layout(
+        updatemenus=[dict(type="buttons", showactive=False, x=0.05, y=0, xanchor="right",
+                          buttons=[dict(label="Play", method="animate", args=[None, play]),
+                                   dict(label="Pause", method="animate",
+                                        args=[[None], dict(play, frame=dict(duration=0, redraw=False))])])],
+        sliders=[dict(currentvalue={"prefix": "Year: "}, pad={"t": 50},
+                      steps=[dict(method="animate", label=str(year + 1), args=[[str(year + 1)], play])
+                             for year in range(num_years)])])
+    return fig
+
+
+def _gif_figure(processed, shape, year):
+    """the sunburst matrix of one year"""
+    fig = make_subplots(rows=shape[0], cols=shape[1],
+                        specs=processed["specs"],
+                        subplot_titles=processed["titles"],
+                        vertical_spacing=0.1)
+    for i in range(shape[0]):
+        for j in range(shape[1]):
+            data = processed["cleaned"][i][j][1][year]
+            fig.add_trace(go.Sunburst(ids=np.arange(len(data)),
+                                      labels=processed["labels"], parents=processed["parents"],
+                                      values=data, branchvalues="total", name=str(year)),
+                          row=i + 1, col=j + 1)
+    fig.update_layout(title={'text': f"Year {year+1}"})
+    return fig
+
+
+def scpf_param(files, var_dict, pfts, years, gridcells=[0], workers=1):
+    """
+    Plots sunburst charts of the proportion of variable by scpf
+    FILES: matrix of tuples of run name and file path, tuples are in
+        the form (run_name, file_path)
+    VAR_DICT: dict of variable names to be plotted in the format of
+        {label: variable_name}
+    PFTS: list of names of pfts
+    YEARS: array of time range of data
+    GRIDCELLS: lndgrid indices summed together, None for all gridcells
+    WORKERS: number of processes reducing runs in parallel
+    FILES is not modified
+    """
+    histories = [f.history for row in files for _, f in row]
+    reduced = iter(reduce_runs(histories, list(var_dict.values()), len(years),
+                               gridcells, workers))
+    cleaned = [[(name, combine(next(reduced), var_dict, pfts)) for name, _ in row]
+               for row in files]
+    titles = [name for row in files for name, _ in row]
+    specs = [[{"type": "sunburst"} for j in range(len(files[i]))] for i in range(len(files))]
+
+    labels = copy.deepcopy(pfts)
+    for v in var_dict:
+        labels.extend([v] * len(pfts))
+
+    parents = [""] * len(pfts)
+    parents += list(range(len(pfts))) * len(var_dict)
+    return {"cleaned": cleaned,
+            "specs": specs,
+            "titles": titles,
+            "parents": parents,
+            "labels": labels
+            }
+
+
+def process(file, var_dict, pfts, year_len, gridcells=[0]):
+    """
+    Sums each variable in VAR_DICT over size classes, per pft. Returns an
+    array of shape (YEAR_LEN, pfts + variables * pfts): the total of every
+    pft over all variables, then every variable of every pft
+    """
+    reduced = reduce_runs([file.history], list(var_dict.values()), year_len, gridcells)[0]
+    return combine(reduced, var_dict, pfts)
@@ -0,0 +1,467 @@
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib import colors
+from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.collections import PolyCollection, LineCollection
+from matplotlib.font_manager import FontProperties
+from matplotlib.ticker import MaxNLocator
+import os
+from .treemap_utils import pre_process, patch_table, site_tables
+from .frames import FrameWriter, ordered_map, spawn_pool, figure_to_rgb
+from .layout import TreemapLayout
+from .store import CohortStore
+from .instrument import stage, count, timed, tagged, install
+import io
+import struct
+import time
+import zipfile
+
+
+@timed("animate_treemap", "mode", "workers")
+def animate_treemap(files, mode="basic", path="", file_name="animated treemap",
+	save_individuals=False, folder_name="individuals", cache=None, workers=1,
+	format="gif", fps=5):
+	frame_dir = path+"/"+folder_name if save_individuals else None
+	years = _years(files)
+	with FrameWriter(f"{path}/{file_name}.{format}", fps, frame_dir) as writer:
+		if workers > 1:
+			# the layout of a year depends on the years before it, so it is
+			# planned here and every worker draws the planned rectangles
+			fig = TreemapFigure(mode)
+			plt.close(fig.fig)
+			with spawn_pool(workers, _init_worker, (files, mode, cache)) as pool:
+				plan = _plan(files, years, mode, cache, fig.engine)
+				for year, frame in zip(years, ordered_map(pool, _render_year, plan, 2 * workers)):
+					writer.append(frame, year)
+					count("frames", year=year)
+		else:
+			fig = TreemapFigure(mode)
+			for year in years:
+				writer.append(_render_frame(files, year, mode, cache, fig), year)
+				count("frames", year=year)
+			plt.close(fig.fig)
+
+
+def _years(files):
+	if isinstance(files, CohortStore):
+		return files.years
+	return list(range(1, len(files.restart)+1))
+
+def _tables(files, year, mode, cache):
+	"""the pre_process tables of YEAR, from FILES, a CohortStore or CACHE"""
+	with stage("preprocess", year=year, mode=mode):
+		if isinstance(files, CohortStore):
+			return files.tables(year, mode)
+		if cache:
+			return cache.get(files, year, mode)
+		return pre_process(files, year, mode)
+
+def _plan(files, years, mode, cache, engine):
+	"""generator of the (year, rects) of every year in YEARS, laid out by ENGINE"""
+	for year in years:
+		areas = _layout_areas(files, year, mode, cache)
+		with stage("layout", year=year):
+			rects = engine(areas)
+		yield year, rects
+
+def _layout_areas(files, year, mode, cache):
+	"""
+	the patch areas of YEAR in the order TreemapFigure lays them out,
+	read without preprocessing the cohorts
+	"""
+	if mode == "one patch":
+		return [1]
+	cached = cache.load_patches(files, year, mode) if cache and not isinstance(files, CohortStore) else None
+	if isinstance(files, CohortStore):
+		cohorts = files.cohorts(year)
+		df2 = patch_table(cohorts['area'], cohorts['age'])[0]
+	elif cached is not None:
+		df2 = cached
+	else:
+		rest_fin = files.restart[year]
+		with stage("read", year=year):
+			area, age = rest_fin.variables['fates_area'][:], rest_fin.variables['fates_age'][:]
+		df2 = patch_table(np.ma.filled(area, 0), np.ma.filled(age, 0))[0]
+	return df2.sort_values(['patch_age', 'patch_area'], kind='stable')['patch_area'].tolist()
+
+def _render_frame(files, year, mode, cache, fig, rects=None):
+	df1, df2 = _tables(files, year, mode, cache)
+	fig.update(df1, df2, year, rects)
+	return figure_to_rgb(fig.fig)
+
+# per-process state of animate_treemap workers
+_worker = {}
+
+def _init_worker(files, mode, cache, sinks=()):
+	plt.switch_backend("Agg")
+	install(sinks)
+	_worker.update(files=files, mode=mode, cache=cache)
+
+def _render_year(task):
+	if "fig" not in _worker:
+		_worker["fig"] = TreemapFigure(_worker["mode"])
+	year, rects = task
+	return _render_frame(_worker["files"], year, _worker["mode"], _worker["cache"], _worker["fig"],
+		rects)
+
+
+@timed("batch_treemap", "mode", "workers")
+def batch_treemap(files, out, mode="basic", years=None, sites=None, workers=1, chunk=64):
+	"""
+	Renders one treemap per site (column) per year of a multi-site run as
+	OUT/site_<site>/year_<year>.png. If OUT ends with ".zip" the images
+	are written into that archive instead. Images already in OUT are not
+	rendered again, so an interrupted run picks up where it stopped.
+	FILES: a Files object or a CohortStore
+	YEARS, SITES: default every year and every site
+	WORKERS: number of processes rendering blocks of CHUNK sites
+	"""
+	years = _years(files) if years is None else list(years)
+	if sites is None and isinstance(files, CohortStore):
+		sites = set().union(*(files.sites(year) for year in years))
+	elif sites is None:
+		sites = range(len(files.restart[years[0]].dimensions['column']))
+	sites = sorted(set(sites))
+	with _BatchOutput(out) as output:
+		tasks = []
+		for year in years:
+			pending = [site for site in sites if _batch_name(site, year) not in output]
+			tasks += [(year, pending[i:i + chunk]) for i in range(0, len(pending), chunk)]
+		if workers > 1:
+			with spawn_pool(workers, _init_worker, (files, mode, None)) as pool:
+				for images in ordered_map(pool, _render_sites, tasks, 2 * workers):
+					for name, image in images:
+						output.write(name, image)
+						count("images")
+					output.commit()
+		else:
+			fig = TreemapFigure(mode)
+			for year, block in tasks:
+				for name, image in _site_images(files, year, block, mode, fig):
+					output.write(name, image)
+					count("images")
+				output.commit()
+			plt.close(fig.fig)
+
+
+def _batch_name(site, year):
+	return f"site_{site}/year_{year}.png"
+
+
+def _site_images(files, year, sites, mode, fig):
+	"""generator of the (name, png bytes) of every site in SITES"""
+	if isinstance(files, CohortStore):
+		present = set(files.sites(year))
+		tables = ((site,) + _store_tables(files, year, mode, site) for site in sites if site in present)
+	else:
+		tables = site_tables(files, year, mode, sites)
+	for site, df1, df2 in tables:
+		# sites are unrelated, their layouts are not carried over
+		fig.engine.reset()
+		with tagged(site=site):
+			fig.update(df1, df2, year)
+			buffer = io.BytesIO()
+			# savefig draws the figure too
+			with stage("encode", year=year):
+				fig.fig.savefig(buffer, format="png")
+		yield _batch_name(site, year), buffer.getvalue()
+
+def _store_tables(store, year, mode, site):
+	with stage("preprocess", year=year, site=site, mode=mode):
+		return store.tables(year, mode, site)
+
+def _render_sites(task):
+	if "fig" not in _worker:
+		_worker["fig"] = TreemapFigure(_worker["mode"])
+	year, sites = task
+	return list(_site_images(_worker["files"], year, sites, _worker["mode"], _worker["fig"]))
+
+
+class _BatchOutput:
+	"""
+	a directory or zip archive of rendered images, see batch_treemap. The
+	central directory of an archive is written at most every COMMIT_SECONDS
+	"""
+
+	def __init__(self, out, commit_seconds=60.):
+		self.out = out
+		self.archive = None
+		self.interval = commit_seconds
+		self.committed = time.perf_counter()
+
+	def __enter__(self):
+		if self.out.endswith(".zip"):
+			if os.path.exists(self.out) and not zipfile.is_zipfile(self.out):
+				_salvage_zip(self.out)
+			self.archive = zipfile.ZipFile(self.out, "a")
+		else:
+			os.makedirs(self.out, exist_ok=True)
+		return self
+
+	def __contains__(self, name):
+		if self.archive:
+			return name in self.archive.NameToInfo
+		return os.path.exists(os.path.join(self.out, name))
+
+	def write(self, name, image):
+		if self.archive:
+			# pngs are already compressed
+			self.archive.writestr(name, image, zipfile.ZIP_STORED)
+			return
+		path = os.path.join(self.out, name)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		# write then rename, so an interrupted run never leaves a partial image
+		with open(path + ".part", "wb") as f:
+			f.write(image)
+		os.replace(path + ".part", path)
+
+	def commit(self):
+		"""
+		writes the central directory of a zip archive, by closing and
+		reopening it, so it can be read as is if the run is killed. That
+		takes time in the number of members, so it is only done once the
+		interval has passed, and the interval grows to ten times the last
+		commit. Images written since the last commit are not lost on a hard
+		interruption, _salvage_zip recovers them when the run is resumed
+		"""
+		if not self.archive or time.perf_counter() - self.committed < self.interval:
+			return
+		start = time.perf_counter()
+		self.archive.close()
+		self.archive = zipfile.ZipFile(self.out, "a")
+		self.committed = time.perf_counter()
+		self.interval = max(self.interval, 10 * (self.committed - start))
+
+	def __exit__(self, *exc):
+		if self.archive:
+			self.archive.close()
+
+
+def _salvage_zip(path):
+	"""
+	Rebuilds the archive PATH from its complete stored members. Appending
+	to a zip archive overwrites its central directory, so an archive
+	killed while images were being added has none until this is run
+	"""
+	header = struct.Struct("<4s5H3I2H")
+	with open(path, "rb") as f, zipfile.ZipFile(path + ".part", "w") as rebuilt:
+		while True:
+			fields = f.read(header.size)
+			if len(fields) < header.size:
+				break
+			signature, _, flags, method, time, date, crc, size, _, name_length, extra_length = \
+				header.unpack(fields)
+			# only members with their sizes in the header can be read back
+			if signature != zipfile.stringFileHeader or flags & 0x08 or method != zipfile.ZIP_STORED:
+				break
+			name = f.read(name_length).decode("utf-8" if flags & 0x800 else "cp437")
+			f.seek(extra_length, os.SEEK_CUR)
+			data = f.read(size)
+			if len(data) < size or zipfile.crc32(data) != crc:
+				break
+			info = zipfile.ZipInfo(name, (1980 + (date >> 9), (date >> 5) & 15, date & 31,
+				time >> 11, (time >> 5) & 63, (time & 31) * 2))
+			rebuilt.writestr(info, data, zipfile.ZIP_STORED)
+	os.replace(path + ".part", path)
+
+
+@timed("treemap", "year", "mode")
+def treemap(files, year, mode="basic", path=None, name=None, cache=None):
+	df1, df2 = _tables(files, year, mode, cache)
+	with stage("render", year=year):
+		fig = TreemapFigure(mode)
+	fig.update(df1, df2, year)
+	if path:
+		if not name:
+			name = year
+		with stage("encode", year=year):
+			fig.fig.savefig(path + f"/{name}.png")
+	return fig.fig
+
+
+class TreemapFigure:
+	"""
+	A treemap figure that can be redrawn for another year. The figure and
+	colorbars are created once. Every patch is drawn on the main axes in
+	figure coordinates: its rectangle comes from a cached, stable
+	TreemapLayout and its bars are mapped into that rectangle, so update()
+	only replaces the vertices and colors of a few collections.
+	TOLERANCE: see TreemapLayout
+	"""
+
+	def __init__(self, mode="basic", tolerance=0.1):
+		self.mode = mode
+		cmaps = colormaps()
+		self.blue, self.yellow, self.purple = cmaps['blue'], cmaps['yellow'], cmaps['purple']
+		# generate figures and axes
+		self.fig, self.mainax = plt.subplots(figsize=(10, 6))
+		fig, mainax = self.fig, self.mainax
+		fig.suptitle("*Stem Color: orange: canopy, grey: understory", x=0.32, y=0.19)
+		self.title = mainax.set_title("", fontsize = 45, position=(0.15,1.01))
+		mainax.set_xticks([])
+		mainax.set_yticks([])
+		mainax.grid(False)
+		plt.subplots_adjust(bottom=0.2)
+
+		# set color scale
+		self.norm = plt.Normalize(vmin=0, vmax=80)
+		self.ax_norm = colors.LogNorm(vmin=1, vmax=1000000)
+
+		if mode != "one patch":
+			colorbar = fig.colorbar(plt.cm.ScalarMappable(cmap=self.blue, norm=self.norm),
+									ax=mainax, label='Years since disturbance')
+			colorbar.ax.yaxis.set_label_position("left")
+		self.pos = pos = mainax.get_position()
+
+		# set cohort color bars
+		if mode != "one patch":
+			cbaxes_yellow = fig.add_axes([pos.x0 + pos.x1, pos.y0, 0.02, pos.height/2 - 0.02])
+			cbaxes_purple = fig.add_axes([pos.x0 + pos.x1, pos.y0 + pos.height/2 + 0.02, 0.02, pos.height/2 -0.02])
+		else:
+			cbaxes_yellow = fig.add_axes([pos.x0 + pos.x1 - 0.08, pos.y0, 0.02, pos.height/2 - 0.02])
+			cbaxes_purple = fig.add_axes([pos.x0 + pos.x1 - 0.08, pos.y0 + pos.height/2 + 0.02, 0.02, pos.height/2 -0.02])
+		colorbar1 = fig.colorbar(plt.cm.ScalarMappable(cmap=self.yellow, norm=self.ax_norm),
+								 cax = cbaxes_yellow, label=' Cedar: # plants in cohort')
+		colorbar2 = fig.colorbar(plt.cm.ScalarMappable(cmap=self.purple, norm=self.ax_norm),
+								 cax = cbaxes_purple, label = 'Ponderosa: # plants in cohort')
+		colorbar1.ax.yaxis.set_label_position("left")
+		colorbar2.ax.yaxis.set_label_position("left")
+
+		mainax.set_facecolor('none')
+		mainax.set_zorder(20)
+		self.engine = TreemapLayout(pos.x0, pos.y0, pos.width, pos.height, tolerance)
+		self.rects = np.empty((0, 4))
+		self.tick_color = 'black' if mode == "one patch" else 'white'
+		self.backgrounds = PolyCollection([], edgecolor='none', linewidth=0, zorder=0.1)
+		self.bars = PolyCollection([], edgecolor='none', linewidth=0, zorder=0.2)
+		self.frames = PolyCollection([], facecolor='none', edgecolor='black', linewidth=0.8, zorder=0.3)
+		self.ticks = LineCollection([], colors=self.tick_color, linewidth=0.8, zorder=0.4)
+		for collection in [self.backgrounds, self.bars, self.frames, self.ticks]:
+			collection.set_transform(fig.transFigure)
+			mainax.add_collection(collection, autolim=False)
+		self.labels = []
+
+	def layout(self, areas, rects=None):
+		"""
+		positions one rectangle per patch area, with its frame and y ticks.
+		RECTS: rectangles planned by this figure's engine, used instead
+		"""
+		self.rects = self.engine(areas) if rects is None else np.asarray(rects)
+		self.frames.set_verts(rectangles(*self.rects.T))
+		# y ticks of 0-75 inside the left edge of every patch, sized like
+		# the ticks of an axes of that height
+		width, height = self.fig.get_size_inches()
+		labelsize = FontProperties(size=plt.rcParams['ytick.labelsize']).get_size_in_points()
+		tick_length = plt.rcParams['ytick.major.size'] / 72 / width
+		label_offset = 17 / 72 / width
+		ticks, labels = [], []
+		for x, y, w, h in self.rects:
+			nbins = max(min(int(h * height * 72 // (labelsize * 2)), 9), 1)
+			locs = MaxNLocator(nbins, steps=[1, 2, 2.5, 5, 10]).tick_values(0, 75)
+			decimals = next(d for d in range(4) if np.allclose(np.round(locs, d), locs))
+			for n, loc in enumerate(locs):
+				if not 0 <= loc <= 75:
+					continue
+				ty = y + loc / 75 * h
+				ticks.append([(x, ty), (x + tick_length, ty)])
+				if 0 < n < len(locs) - 1:
+					labels.append((x + label_offset, ty, f"{loc:.{decimals}f}"))
+		self.ticks.set_segments(ticks)
+		while len(self.labels) < len(labels):
+			self.labels.append(self.mainax.text(0, 0, "", transform=self.fig.transFigure,
+				ha="right", va="center_baseline", fontsize=labelsize, color=self.tick_color,
+				zorder=0.5))
+		for n, text in enumerate(self.labels):
+			text.set_visible(n < len(labels))
+			if n < len(labels):
+				text.set_position(labels[n][:2])
+				text.set_text(labels[n][2])
+
+	def update(self, df1, df2, year, rects=None):
+		"""redraws the figure with the data of one year, see layout for RECTS"""
+		df2 = df2.sort_values(['patch_age', 'patch_area'], kind='stable')
+		self.title.set_text(f"Year {year}")
+		with stage("layout", year=year):
+			self.layout(df2['patch_area'].tolist(), rects)
+		with stage("render", year=year):
+			self._draw(df1, df2)
+
+	def _draw(self, df1, df2):
+		"""sets the patch colors and cohort bars of the laid out patches"""
+		self.backgrounds.set_verts(rectangles(*self.rects.T))
+		if self.mode != "one patch":
+			self.backgrounds.set_facecolor(self.blue(self.norm(df2['patch_age'].to_numpy())))
+		else:
+			self.backgrounds.set_facecolor('white')
+		groups = dict(tuple(df1.groupby('patch', sort=False)))
+		verts, facecolors = [], []
+		for (x, y, w, h), patch in zip(self.rects, df2['patch']):
+			patch_verts, patch_colors = self.patch_bars(groups.get(patch, df1.iloc[:0]))
+			if not len(patch_verts):
+				continue
+			left, right = patch_verts[:, 0, 0].min(), patch_verts[:, 2, 0].max()
+			margin = (right - left) * 0.05
+			left, right = left - margin, right + margin
+			# map the bars from the patch's data coordinates, x spanning the
+			# bars and y from 0 to 75, into its rectangle
+			fx = x + (patch_verts[..., 0] - left) / (right - left) * w
+			fy = y + np.clip(patch_verts[..., 1], 0, 75) / 75 * h
+			verts.append(np.stack([fx, fy], -1))
+			facecolors.append(patch_colors)
+		self.bars.set_verts(np.concatenate(verts) if verts else [])
+		self.bars.set_facecolor(np.concatenate(facecolors) if facecolors else 'none')
+
+	def patch_bars(self, patch):
+		"""
+		Returns the rectangle vertices and colors of the crowns and stems in
+		PATCH, in the order they are drawn
+		"""
+		verts, facecolors = [], []
+		for i, c in zip([1,2], [self.purple, self.yellow]):
+			filtered = patch[patch['pft'] == i]
+			index = filtered['stem_location'].to_numpy()
+			crown_bottom = filtered['canopy_bottom'].to_numpy()
+			crown_width = filtered['canopy_width'].to_numpy()
+			tree_height = filtered['cohort_height'].to_numpy()
+			verts.append(rectangles(index - crown_width/2, crown_bottom, crown_width, tree_height*0.4))
+			facecolors.append(c(self.ax_norm(filtered['num_plants'].to_numpy())))
+			verts.append(rectangles(index - 5, 0, 10, crown_bottom))
+			facecolors.append(colors.to_rgba_array(filtered['canopy_layer'].tolist()).reshape(-1, 4))
+		return np.concatenate(verts), np.concatenate(facecolors)
+
+
+def rectangles(x, y, width, height):
+	"""vertices of axis-aligned rectangles as an (n, 4, 2) array"""
+	x, y, width, height = np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in
+		(x, y, width, height)])
+	return np.stack([np.stack([x, y], -1), np.stack([x, y + height], -1),
+		np.stack([x + width, y + height], -1), np.stack([x + width, y], -1)], 1)
+
+
+
+# the treemap colormaps, built and registered on first use
+_colormaps = {}
+
+def colormaps():
+	"""
+	the treemap colormaps by name: blue for patch age, yellow and purple for
+	the plants per cohort, and red. yellow and purple are also registered
+	with matplotlib as "myyellow" and "mypurple"
+	"""
+	if not _colormaps:
+		_colormaps['blue'] = LinearSegmentedColormap.from_list('blue', ['#96ffff', '#000080'])
+		_colormaps['yellow'] = LinearSegmentedColormap.from_list('yellow', ['#fffd98', '#fc7753'])
+		_colormaps['red'] = LinearSegmentedColormap.from_list('red', ['#03edfc', '#e80013'])
+		interval = np.hstack(np.linspace(0.25,1))
+		_colormaps['purple'] = LinearSegmentedColormap.from_list('name', plt.cm.Purples(interval))
+		for name in ['yellow', 'purple']:
+			if "my" + name not in matplotlib.colormaps:
+				matplotlib.colormaps.register(_colormaps[name], name="my" + name)
+	return _colormaps
+
+def __getattr__(name):
+	# the colormaps used to be module globals
+	if name in ('blue', 'yellow', 'red', 'purple'):
+		return colormaps()[name]
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,238 @@
+import numpy as np
+import pandas as pd
+from .allometry import allom_params, crown_area
+from .instrument import stage
+
+SIZE_CLASS_EDGES = np.array([0,5,10,15,20,30,40,50,60,70,80,90,100,np.inf])
+SIZE_CLASS_LABELS = ['SC1', 'SC2', 'SC3', 'SC4', 'SC5', 'SC6', 'SC7', 'SC8',
+					 'SC9', 'SC10', 'SC11', 'SC12', 'SC13']
+# the smallest patches adding up to at most this area are merged into one
+SMALL_PATCH_AREA = 1000
+
+def pre_process(files, year, mode="basic", threshold=SMALL_PATCH_AREA):
+	"""
+	A tedious pre-processing function that prepares data for plotting
+	THRESHOLD: the smallest patches adding up to at most this area are
+		drawn as one patch
+	"""
+	with stage("preprocess", year=year, mode=mode):
+		return cohort_tables(read_cohorts(files.restart[year], files.param), year, mode, threshold)
+
+
+def read_cohorts(rest_fin, param_fin, start=0, stop=None, params=None):
+	"""
+	Reads the cohort vectors of the sites (columns) START to STOP of a
+	restart file, all sites by default, along with their crown areas.
+	PARAMS: allom_params of PARAM_FIN, computed if not passed in
+	Returns a dict of arrays over the cohort slots of those sites
+	"""
+	nsites = len(rest_fin.dimensions['column'])
+	per_site = len(rest_fin.dimensions['cohort']) // nsites
+	stop = nsites if stop is None else stop
+	cohorts = slice(start * per_site, stop * per_site)
+	variables = rest_fin.variables
+	with stage("read"):
+		data = {name: variables['fates_' + name][cohorts] for name in
+			['pft', 'dbh', 'height', 'nplant', 'canopy_layer', 'area', 'age']}
+		spread = variables['fates_spread'][start:stop]
+	with stage("allometry"):
+		if params is None:
+			params = allom_params(param_fin)
+		data['crown_area'] = crown_area(data['pft'], data['dbh'], data['nplant'], spread, params)
+	data['slot'] = np.arange(cohorts.start, cohorts.stop)
+	return data
+
+
+def cohort_tables(cohorts, year, mode="basic", threshold=SMALL_PATCH_AREA):
+	"""
+	Builds the (df1, df2) tables pre_process returns from the cohort
+	vectors COHORTS returned by read_cohorts
+	"""
+	crown_area = cohorts['crown_area']
+	cohort_height = cohorts['height']
+	pft = cohorts['pft']
+	canopy_layer = cohorts['canopy_layer']
+	trunk_width = cohorts['dbh']
+	num_plants = cohorts['nplant']
+
+	# pull patch data, patch area and age are only stored on the first
+	# cohort slot of each patch
+	patch_area = np.ma.filled(cohorts['area'], 0)
+	patch_age = np.ma.filled(cohorts['age'], 0)
+	patch = patch_index(patch_area)
+
+	# make dataframe1: combined cohort and patch data
+	data1 = {
+		'crown_area':crown_area,
+		'cohort_height': cohort_height,
+		'pft': pft,
+		'canopy_layer': canopy_layer,
+		'trunk_width': trunk_width,
+		'patch': patch,
+		'num_plants': num_plants*1600}
+	df1 = pd.DataFrame(data1, index=cohorts['slot'])
+	df1 = df1[(df1['cohort_height'] != 0) & (df1['patch'] >= 0)] # gets rid of empty cohorts
+	df1['canopy_layer'] = df1['canopy_layer'].replace({1: 'orange', 2: 'grey'})
+
+	# make dataframe2: a master df that only has patch data
+	df2, patch_map = patch_table(patch_area, patch_age, threshold)
+	df1['patch'] = patch_map[df1['patch'].to_numpy()]
+	df1 = df1.merge(df2[['patch', 'patch_area', 'patch_age']], on='patch', how='left',
+		sort=False).set_index(df1.index)
+
+	# calculate coverage by patch
+	df2 = df2.assign(coverages = patch_coverages(df1, df2))
+
+	# sort data by height
+	df1 = df1.sort_values(['patch_area', 'patch', 'cohort_height'], kind='stable')
+	df2 = df2.sort_values(['patch_area', 'patch'], kind='stable')
+	# make data for plotting canopy and stem
+	df1['canopy_bottom'] = df1['cohort_height'] * 0.6
+	df1['canopy_width'] = df1['crown_area'] / (df1['cohort_height'] * 0.4)
+	df1['stem_location'] = stem_locations(df1['canopy_width'], df1['patch'])
+	df1['year'], df2['year'] = year, year
+
+	if mode == "basic":
+		return df1, df2
+	# create a simplified version of the data
+	binned = df1.assign(dbh_binned = pd.cut(df1['trunk_width'], SIZE_CLASS_EDGES,
+											labels = SIZE_CLASS_LABELS))
+	simplified_patches = binned.groupby(['patch', 'pft', 'canopy_layer', 'dbh_binned'],
+										observed=True, sort=True).agg(
+					trunk_width = ('trunk_width', 'median'),
+					num_plants=('num_plants', 'sum'),
+					cohort_height = ('cohort_height', 'median'),
+					crown_area = ('crown_area', 'sum'),
+					patch_area = ('patch_area', 'first'),
+					patch_age = ('patch_age', 'first'))
+	simplified_patches = simplified_patches.reset_index().dropna()
+	simplified_patches['canopy_bottom'] = simplified_patches['cohort_height'] * 0.6
+	simplified_patches['canopy_width'] = simplified_patches['crown_area'] / (simplified_patches['cohort_height'] * 0.4)
+	simplified_patches = simplified_patches.sort_values(by=['patch_area', 'patch', 'canopy_layer', 'pft'],
+														kind='stable', ignore_index=True)
+	simplified_patches['stem_location'] = stem_locations(simplified_patches['canopy_width'],
+														 simplified_patches['patch'])
+	simplified_patches['year'] = year
+
+	if mode == "patch simplified":
+		return simplified_patches, df2
+	elif mode == "one patch":
+		simplified_patches = simplified_patches.sort_values(by="cohort_height", kind='stable')
+		simplified_patches["stem_location"] = stem_locations(simplified_patches["canopy_width"])
+		simplified_patches["patch"] = 0
+		simplified_patches["patch_age"] = 0
+		simplified_patches["patch_area"] = 1
+		df2 = pd.DataFrame({"patch": [0], "patch_age":[0], "patch_area": [1]})
+		return simplified_patches, df2
+
+
+def site_tables(files, year, mode="basic", sites=None, chunk=64, threshold=SMALL_PATCH_AREA):
+	"""
+	Generator over the sites (columns) of a multi-site restart file that
+	yields (site, df1, df2), the pre_process tables of each site in SITES
+	(default: every site) of YEAR. Cohort vectors are read in blocks of at
+	most CHUNK consecutive sites, so only one block is in memory at a time.
+	Sites without patches are skipped
+	"""
+	rest_fin = files.restart[year]
+	with stage("allometry"):
+		params = allom_params(files.param)
+	nsites = len(rest_fin.dimensions['column'])
+	sites = sorted(range(nsites) if sites is None else set(sites))
+	per_site = len(rest_fin.dimensions['cohort']) // nsites
+	while sites:
+		first = sites[0]
+		block = [site for site in sites if site < first + chunk]
+		sites = sites[len(block):]
+		cohorts = read_cohorts(rest_fin, files.param, first, block[-1] + 1, params)
+		for site in block:
+			offset = (site - first) * per_site
+			one = {name: values[offset:offset + per_site] for name, values in cohorts.items()}
+			if not np.ma.filled(one['area'], 0).any():
+				continue
+			with stage("preprocess", year=year, site=site, mode=mode):
+				tables = cohort_tables(one, year, mode, threshold)
+			yield (site,) + tables
+
+
+def patch_table(patch_area, patch_age, threshold=SMALL_PATCH_AREA):
+	"""
+	PATCH_AREA, PATCH_AGE: fates_area and fates_age of a restart file
+	Returns the table of patches, with the smallest patches whose areas add
+	up to at most THRESHOLD merged into one, and an array mapping every
+	patch index to the patch it ended up in. A merged patch has the lowest
+	index of its members, their total area and their area-weighted age
+	"""
+	patch = patch_index(patch_area)
+	starts = patch_area != 0
+	area, age = patch_area[starts], patch_age[starts]
+
+	# merge small areas
+	patch_map = np.arange(starts.sum())
+	# merge exactly the smallest patches that fit, ties go to the lowest index
+	order = np.argsort(area, kind='stable')
+	count = np.searchsorted(np.cumsum(area[order]), threshold, side='right')
+	small = order[:count]
+	if count:
+		patch_map[small] = patch_map[small].min()
+	df2 = pd.DataFrame({'patch': patch_map, 'patch_area': area, 'weighted_age': area * age})
+	df2 = df2.groupby('patch', sort=False, as_index=False).sum()
+	df2['patch_age'] = df2.pop('weighted_age') / df2['patch_area']
+	return df2, patch_map
+
+
+def patch_index(patch_area):
+	"""
+	PATCH_AREA: fates_area of a restart file, nonzero on the first cohort
+		slot of each patch
+	Returns the patch index of every cohort slot, -1 before the first patch
+	"""
+	return np.cumsum(np.asarray(patch_area) != 0) - 1
+
+
+def stem_locations(canopy_width, patch=None):
+	"""
+	Lays out stems side by side, 10 units apart plus the canopy width,
+	restarting at 0 in every PATCH. Rows must already be sorted by patch
+	"""
+	width = np.asarray(canopy_width, dtype=float) + 10
+	cumsum = np.cumsum(width)
+	if patch is not None and len(width):
+		patch = np.asarray(patch)
+		first = np.concatenate(([True], patch[1:] != patch[:-1]))
+		offsets = np.concatenate(([0.], cumsum[:-1]))[first]
+		cumsum = cumsum - np.repeat(offsets, np.diff(np.append(np.nonzero(first)[0], len(width))))
+	return cumsum - width / 2
+
+
+def patch_coverages(df1, df2):
+	"""
+	Returns [canopy, understory, open] crown area coverage of every patch
+	in DF2, computed from the cohorts in DF1 in a single groupby
+	"""
+	layers = df1.groupby(['patch', 'canopy_layer'])['crown_area'].sum().unstack(fill_value=0)
+	layers = layers.reindex(index=df2['patch'], columns=['orange', 'grey'], fill_value=0)
+	canopy = layers['orange'].to_numpy(dtype=float)
+	understory = layers['grey'].to_numpy(dtype=float)
+	bare = np.clip(df2['patch_area'].to_numpy() - np.maximum(canopy, understory), 0, None)
+	return [list(row) for row in zip(canopy, understory, bare)]
+
+
+def carea_allom(rest_fin, paramfin):
+		"""REST_FIN: a restart file
+		   PARAMFIN: a parameter file
+		   Returns a masked array of the crown area of each cohort, empty
+		   cohort slots are masked
+		"""
+		with stage("read"):
+			cohorts = [rest_fin.variables[name][:] for name in
+				['fates_pft', 'fates_dbh', 'fates_nplant', 'fates_spread']]
+		with stage("allometry"):
+			return crown_area(*cohorts, allom_params(paramfin))
+
+# some helper functions
+def find_max(self):
+	"""find the max number of plants in a file upload"""
+	for file in self.detailed:
+		max_in_one_file = max(file['num_plants'].tolist())
+		self.max_plants = max(self.max_plants, max_in_one_file)